@@ -0,0 +1,232 @@
+import argparse
+import time
+import unittest
+import numpy
+import minimax
+from bitboard import BitGame
+from minimax import Game
+
+# Evaluate many 5 x 5 boards at once, for analysis.
+#
+# Boards are given either as an (N, 5, 5) int8 array, with EMPTY for '.'
+# and ' ', X and O, or as an (N, 2) integer array of (x_mask, o_mask) in
+# the bitboard.py layout. Results follow Game.game_over() and
+# Game.get_cheating_move() exactly.
+
+EMPTY = 0
+X = 1
+O = 2
+DRAW = 3
+SYMBOLS = { 'X': X, 'O': O, '.': EMPTY, ' ': EMPTY }
+
+# Cells of each line in minimax.LINES, as indexes into a flattened board
+LINE_CELLS = numpy.array([ [ y*5 + x for (x, y) in cells ] for (cells, c1, c2) in minimax.LINES ],
+                         dtype=numpy.intp)
+LINE_MASKS = numpy.array([ sum([ 1 << i for i in l ]) for l in LINE_CELLS ], dtype=numpy.int64)
+# End points (c1, c2) of each line
+ENDPOINTS = numpy.array([ [ c1, c2 ] for (cells, c1, c2) in minimax.LINES ], dtype=numpy.int8)
+INNER_CELLS = numpy.array([ y*5 + x for y in range(1, 4) for x in range(1, 4) ], dtype=numpy.intp)
+
+# Rows processed at a time, to bound memory use
+CHUNK = 65536
+
+def to_array(boards):
+    """
+    Convert list of 5 x 5 lists (as returned by Game.get_board()) to an (N, 5, 5) array
+    """
+    return numpy.array([ [ [ SYMBOLS[c] for c in row ] for row in board ] for board in boards ],
+                       dtype=numpy.int8).reshape(-1, 5, 5)
+
+def masks_to_array(masks):
+    """
+    Convert (N, 2) array of (x_mask, o_mask) to an (N, 5, 5) array
+    """
+    masks = numpy.asarray(masks, dtype=numpy.int64)
+    bits = (masks[:, :, None] >> numpy.arange(25, dtype=numpy.int64)) & 1
+    return (bits[:, 0]*X + bits[:, 1]*O).astype(numpy.int8).reshape(-1, 5, 5)
+
+def is_masks(boards):
+    return boards.ndim == 2 and boards.shape[1] == 2
+
+def game_over_batch(boards):
+    """
+    Evaluate all boards like Game.game_over().
+    Returns (winner, line, c1, c2): winner is EMPTY (game not over), X, O
+    or DRAW; line is the index into minimax.LINES of the winning line or -1;
+    c1 and c2 are (N, 2) arrays of the end points, valid where line >= 0.
+    """
+    boards = numpy.asarray(boards)
+    n = boards.shape[0]
+    winner = numpy.zeros(n, dtype=numpy.int8)
+    line = numpy.full(n, -1, dtype=numpy.int16)
+    for start in range(0, n, CHUNK):
+        end = min(n, start + CHUNK)
+        if is_masks(boards):
+            (winner[start:end], line[start:end]) = game_over_masks(boards[start:end])
+        else:
+            (winner[start:end], line[start:end]) = game_over_cells(boards[start:end].reshape(-1, 25))
+    ends = ENDPOINTS[numpy.maximum(line, 0)]
+    return (winner, line, ends[:, 0], ends[:, 1])
+
+def game_over_cells(flat):
+    """
+    game_over_batch() for an (n, 25) array
+    """
+    v = flat[:, LINE_CELLS]
+    won = (v[:, :, 0] != EMPTY) & (v[:, :, 0] == v[:, :, 1]) & (v[:, :, 0] == v[:, :, 2])
+    has_line = won.any(axis=1)
+    # argmax finds the first line, as game_over() does
+    first = won.argmax(axis=1)
+    winner = v[numpy.arange(len(flat)), first, 0]
+    full = (flat[:, INNER_CELLS] != EMPTY).all(axis=1)
+    winner = numpy.where(has_line, winner, numpy.where(full, DRAW, EMPTY))
+    return (winner, numpy.where(has_line, first, -1))
+
+def game_over_masks(masks):
+    """
+    game_over_batch() for an (n, 2) array of masks
+    """
+    masks = masks.astype(numpy.int64)
+    x_won = (masks[:, 0:1] & LINE_MASKS) == LINE_MASKS
+    o_won = (masks[:, 1:2] & LINE_MASKS) == LINE_MASKS
+    won = x_won | o_won
+    has_line = won.any(axis=1)
+    first = won.argmax(axis=1)
+    winner = numpy.where(x_won[numpy.arange(len(masks)), first], X, O)
+    inner = int(sum([ 1 << int(i) for i in INNER_CELLS ]))
+    full = ((masks[:, 0] | masks[:, 1]) & inner) == inner
+    winner = numpy.where(has_line, winner, numpy.where(full, DRAW, EMPTY))
+    return (winner, numpy.where(has_line, first, -1))
+
+def cheat_batch(boards, symbol):
+    """
+    Find cheating move for symbol on all boards, like Game.get_cheating_move().
+    Returns (priority, x, y) arrays, priority is 0 where there is no cheating move.
+    """
+    boards = numpy.asarray(boards)
+    if is_masks(boards):
+        boards = masks_to_array(boards)
+    flat = boards.reshape(-1, 25)
+    sym = SYMBOLS[symbol]
+    (winner, line, c1, c2) = game_over_batch(flat.reshape(-1, 5, 5))
+    # If somebody has already won, any move "wins"
+    won = (winner == X) | (winner == O)
+    n = len(flat)
+    prio = numpy.zeros(n, dtype=numpy.int8)
+    xs = numpy.zeros(n, dtype=numpy.int8)
+    ys = numpy.zeros(n, dtype=numpy.int8)
+    for (p, x, y, lines) in minimax.CHEAT_SQUARES:
+        i = (y+1)*5 + x+1
+        cells = numpy.array([ [ cy*5 + cx for (cx, cy) in l[0] ] for l in lines ], dtype=numpy.intp)
+        # The square is empty, so the line is ours if the other two cells are
+        ours = ((flat[:, cells] == sym).sum(axis=2) == 2).any(axis=1)
+        hit = (prio == 0) & (flat[:, i] == EMPTY) & (won | ours)
+        prio[hit] = p
+        xs[hit] = x
+        ys[hit] = y
+    return (prio, xs, ys)
+
+def random_boards(n, rng, border=True):
+    """
+    Return (n, 5, 5) array of random boards
+    """
+    boards = rng.integers(0, 3, size=(n, 5, 5), dtype=numpy.int8)
+    if not border:
+        boards[:, 0, :] = EMPTY
+        boards[:, 4, :] = EMPTY
+        boards[:, :, 0] = EMPTY
+        boards[:, :, 4] = EMPTY
+    return boards
+
+def to_game(board):
+    g = Game()
+    for y in range(0, 5):
+        for x in range(0, 5):
+            if board[y][x] != EMPTY:
+                g.current_state[y][x] = 'X' if board[y][x] == X else 'O'
+    return g
+
+class TestBatchMethods(unittest.TestCase):
+
+    def check_game_over(self, boards, result):
+        (winner, line, c1, c2) = result
+        for i in range(0, len(boards)):
+            go = to_game(boards[i]).game_over()
+            if go is None:
+                self.assertEqual(winner[i], EMPTY)
+            elif go[0] == '.':
+                self.assertEqual(winner[i], DRAW)
+            else:
+                self.assertEqual(winner[i], SYMBOLS[go[0]])
+                self.assertEqual(tuple(c1[i]), go[1])
+                self.assertEqual(tuple(c2[i]), go[2])
+
+    def test_game_over(self):
+        rng = numpy.random.default_rng(1)
+        for border in [ True, False ]:
+            boards = random_boards(2000, rng, border)
+            # Also some sparse boards
+            boards[:1000][rng.random((1000, 5, 5)) < 0.6] = EMPTY
+            self.check_game_over(boards, game_over_batch(boards))
+
+    def test_masks(self):
+        rng = numpy.random.default_rng(2)
+        boards = random_boards(1000, rng)
+        boards[rng.random((1000, 5, 5)) < 0.5] = EMPTY
+        masks = []
+        for b in boards:
+            g = BitGame()
+            g.load(to_game(b).get_board())
+            masks.append((g.x_mask, g.o_mask))
+        masks = numpy.array(masks)
+        self.assertTrue((masks_to_array(masks) == boards).all())
+        self.check_game_over(boards, game_over_batch(masks))
+
+    def test_to_array(self):
+        g = Game()
+        g.set_human('O')
+        g.make_human_move(1, 1)
+        g.make_computer_move(-1, 2, force=True)
+        a = to_array([ g.get_board() ])
+        self.assertEqual(a.shape, (1, 5, 5))
+        self.assertEqual(a[0, 2, 2], O)
+        self.assertEqual(a[0, 3, 0], X)
+        self.assertEqual(a.sum(), O + X)
+
+    def test_cheat(self):
+        rng = numpy.random.default_rng(3)
+        boards = random_boards(2000, rng, border=False)
+        boards[rng.random((2000, 5, 5)) < 0.4] = EMPTY
+        # Also boards where some cheat squares are already taken
+        border = random_boards(2000, rng, border=True)
+        border[rng.random((2000, 5, 5)) < 0.6] = EMPTY
+        boards = numpy.concatenate([ boards, border ])
+        self.assertTrue((boards[:, 0, :] != EMPTY).any())
+        for symbol in [ 'X', 'O' ]:
+            (prio, xs, ys) = cheat_batch(boards, symbol)
+            for i in range(0, len(boards)):
+                g = to_game(boards[i])
+                g.set_human(g.get_enemy(symbol))
+                cheat = g.get_cheating_move()
+                if cheat is None:
+                    self.assertEqual(prio[i], 0)
+                else:
+                    self.assertEqual((prio[i], xs[i], ys[i]), cheat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Batch evaluation of boards.')
+    parser.add_argument('-n', '--number', type=int, default=1000000,
+                        help='Number of random boards to evaluate (default 1000000)')
+    args = parser.parse_args()
+    rng = numpy.random.default_rng()
+    boards = random_boards(args.number, rng, border=False)
+    start = time.time()
+    (winner, line, c1, c2) = game_over_batch(boards)
+    print('game_over_batch: %d boards in %.2f s' % (args.number, time.time() - start))
+    start = time.time()
+    (prio, xs, ys) = cheat_batch(boards, 'X')
+    print('cheat_batch: %d boards in %.2f s' % (args.number, time.time() - start))
+    undecided = winner == EMPTY
+    print('%d undecided, X can cheat in %d of them' % (undecided.sum(), (prio[undecided] > 0).sum()))
+    # Arguments are for the timing above, not for unittest
+    unittest.main(argv=[ 'batch.py' ])
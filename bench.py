@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from engine import Engine
+from minimax import Game, ORDERINGS, SearchStats
+
+# Benchmarks for the game engine, and for symbol detection (--detect).
+#
+# Timings can be saved as a baseline (BASELINE_FILE) and later runs compared
+# against it, failing if any benchmark got slower than the threshold allows:
+#
+#   python bench.py --save       # after a change that is known to be good
+#   python bench.py --compare    # before committing an optimisation
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench-baseline.json')
+# Fail --compare if a benchmark takes longer than this times its baseline
+THRESHOLD = 1.25
+
+def make_game(human, moves):
+    """
+    Return Game after moves, a list of (symbol, x, y)
+    """
+    g = Game()
+    g.set_human(human)
+    for (sym, x, y) in moves:
+        g.make_move(x, y, sym, force=True)
+    return g
+
+# Positions where the computer (X) is to move
+POSITIONS = {
+    'opening': [ ('O', 1, 1) ],
+    'midgame': [ ('O', 1, 1), ('X', 0, 0), ('O', 0, 1) ],
+    'endgame': [ ('O', 2, 0), ('O', 0, 1), ('O', 0, 2), ('O', 1, 2),
+                 ('X', 1, 0), ('X', 1, 1), ('X', 2, 2) ],
+}
+
+def count_calls(fn, names):
+    """
+    Call fn once and return how many times functions named in names were called
+    """
+    counts = dict([ (name, 0) for name in names ])
+    def profile(frame, event, arg):
+        if event == 'call' and frame.f_code.co_name in counts:
+            counts[frame.f_code.co_name] = counts[frame.f_code.co_name] + 1
+    sys.setprofile(profile)
+    try:
+        fn()
+    finally:
+        sys.setprofile(None)
+    return counts
+
+def peak_memory(fn):
+    """
+    Call fn once and return the peak of memory allocated during the call
+    """
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+def time_per_call(fn, min_time=0.5):
+    """
+    Return average time in seconds for a call to fn
+    """
+    n = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        fn()
+        n = n + 1
+        elapsed = time.perf_counter() - start
+    return elapsed/n
+
+def best_time_per_call(fn, repeat=3, min_time=0.2):
+    """
+    Return best of repeat measurements of time_per_call()
+    """
+    return min([ time_per_call(fn, min_time) for i in range(0, repeat) ])
+
+def percentile(values, p):
+    """
+    Return the p'th percentile of values (nearest rank)
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+    i = int(round(p/100*(len(values) - 1)))
+    return values[i]
+
+def quiet(fn):
+    """
+    Return fn wrapped to discard what it prints
+    """
+    def wrapper():
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            return fn()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return wrapper
+
+def benchmarks():
+    """
+    Return list of (name, fn) for the hot paths of the engine
+    """
+    result = []
+    for name in POSITIONS:
+        g = make_game('O', POSITIONS[name])
+        result.append(('game_over/%s' % name, g.game_over))
+    g = make_game('O', [])
+    result.append(('max_alpha_beta/empty', lambda g=g: g.max_alpha_beta(-2, 2)))
+    for y in range(0, 3):
+        for x in range(0, 3):
+            g = make_game('O', [ ('O', x, y) ])
+            result.append(('max_alpha_beta/opening%d%d' % (x, y), lambda g=g: g.max_alpha_beta(-2, 2)))
+    for name in POSITIONS:
+        for early in [ False, True ]:
+            g = make_game('O', POSITIONS[name])
+            fn = quiet(lambda g=g, early=early: g.get_computer_move(allow_early_cheat=early))
+            result.append(('get_computer_move/%s%s' % (name, '/early' if early else ''), fn))
+    for name in POSITIONS:
+        g = make_game('O', POSITIONS[name])
+        result.append(('get_cheating_move/%s' % name, g.get_cheating_move))
+    return result
+
+def run(select=None):
+    """
+    Run benchmarks whose name contains select (all if None).
+    Returns dict of name -> seconds per call.
+    """
+    results = {}
+    for (name, fn) in benchmarks():
+        if select and select not in name:
+            continue
+        results[name] = best_time_per_call(fn)
+        print('%-40s %10.1f us' % (name, results[name]*1e6))
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Print results relative to baseline.
+    Returns list of names of benchmarks slower than threshold times baseline.
+    """
+    slower = []
+    for name in results:
+        if name not in baseline:
+            print('%-40s no baseline' % name)
+            continue
+        ratio = results[name]/baseline[name]
+        status = ''
+        if ratio > threshold:
+            status = 'SLOWER'
+            slower.append(name)
+        print('%-40s %10.1f us %10.1f us %6.2fx %s' % (name, baseline[name]*1e6, results[name]*1e6, ratio, status))
+    return slower
+
+def bench_get_computer_move():
+    print('get_computer_move: %-10s %10s %8s %10s %10s' % ('position', 'time/call', 'Games', 'deepcopy', 'peak mem'))
+    for name in POSITIONS:
+        for early in [ False, True ]:
+            g = make_game('O', POSITIONS[name])
+            fn = lambda: g.get_computer_move(allow_early_cheat=early)
+            t = time_per_call(fn)
+            counts = count_calls(fn, [ '__init__', 'deepcopy' ])
+            mem = peak_memory(fn)
+            label = name + (' early' if early else '')
+            print('                   %-16s %7.3f ms %8d %10d %8d B' %
+                  (label, t*1000, counts['__init__'], counts['deepcopy'], mem))
+
+def bench_ordering():
+    """
+    Print nodes searched with each move ordering
+    """
+    print('%-40s %12s %10s' % ('move ordering', 'nodes', 'time'))
+    for ordering in ORDERINGS:
+        stats = SearchStats()
+        start = time.perf_counter()
+        for moves in [ [] ] + [ [ ('O', x, y) ] for y in range(0, 3) for x in range(0, 3) ]:
+            g = make_game('O', moves)
+            g.set_move_ordering(ordering)
+            g.stats = stats
+            g.max_alpha_beta(-2, 2)
+        print('%-40s %12d %8.1f ms' % ('3 x 3 empty and openings/' + ordering, stats.nodes,
+                                       1000*(time.perf_counter() - start)))
+    for (w, h, k, depth) in [ (4, 4, 3, 6), (5, 5, 4, 4), (7, 6, 4, 4) ]:
+        for ordering in ORDERINGS:
+            e = Engine(w, h, k, 1, ordering=ordering)
+            e.set_human('O')
+            e.make_human_move(w//2, h//2)
+            start = time.perf_counter()
+            e.search('X', time_budget=None, max_depth=depth)
+            print('%-40s %12d %8.1f ms' % ('%d x %d, %d in a row, depth %d/%s' % (w, h, k, depth, ordering),
+                                           e.nodes, 1000*(time.perf_counter() - start)))
+
+def bench_detect_symbols():
+    """
+    Print wall time of detect.detect_symbols() with different numbers of threads
+    """
+    import detect
+    pic = detect.make_grid_pic(detect.GRID_IMAGES)
+    xx = (0, pic.shape[1])
+    yy = (0, pic.shape[0])
+    inner = Game().get_board()
+    full = [ [ '.' ]*5 for y in range(0, 5) ]
+    print('detect_symbols: %d CPUs' % os.cpu_count())
+    for (name, board) in [ ('9 cells', inner), ('25 cells', full) ]:
+        for workers in [ 1, 2, 4 ]:
+            fn = quiet(lambda board=board, workers=workers:
+                       detect.detect_symbols(pic.copy(), xx, yy, board, workers=workers))
+            print('%-40s %10.1f ms' % ('%s/%d threads' % (name, workers), 1000*best_time_per_call(fn)))
+
+def bench_background_colour():
+    """
+    Print time to find the background colour in detect_grid() on full size frames
+    """
+    import cv2
+    import numpy
+    import detect
+    frame = cv2.imread('problems/o-outside-grid/out.png')
+    for (w, h) in [ (640, 480), (1280, 720), (1920, 1080) ]:
+        img = cv2.resize(frame, (w, h))
+        def unique(img=img):
+            colors, count = numpy.unique(img.reshape(-1, 3), axis=0, return_counts=True)
+            return colors[count.argmax()]
+        print('%-40s %10.1f ms' % ('background %dx%d/unique' % (w, h), 1000*best_time_per_call(unique, 1)))
+        for step in [ 1, 2, 4 ]:
+            fn = lambda img=img, step=step: detect.background_colour(img, step)
+            print('%-40s %10.1f ms %s' % ('background %dx%d/packed step %d' % (w, h, step),
+                                          1000*best_time_per_call(fn), fn()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the game engine.')
+    parser.add_argument('-s', '--save', action='store_true',
+                        help='Save results as baseline')
+    parser.add_argument('-c', '--compare', action='store_true',
+                        help='Compare with baseline, fail if slower')
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='Allowed slowdown for --compare (default %.2f)' % THRESHOLD)
+    parser.add_argument('-b', '--baseline', default=BASELINE_FILE,
+                        help='Baseline file (default %s)' % BASELINE_FILE)
+    parser.add_argument('-k', '--select', help='Only run benchmarks with this in the name')
+    parser.add_argument('-a', '--alloc', action='store_true',
+                        help='Show allocations in get_computer_move')
+    parser.add_argument('-o', '--ordering', action='store_true',
+                        help='Show nodes searched with each move ordering')
+    parser.add_argument('-d', '--detect', action='store_true',
+                        help='Time symbol detection with and without threads, and background colour')
+    args = parser.parse_args()
+    if args.alloc:
+        bench_get_computer_move()
+        exit()
+    if args.ordering:
+        bench_ordering()
+        exit()
+    if args.detect:
+        bench_detect_symbols()
+        bench_background_colour()
+        exit()
+    results = run(args.select)
+    if args.save:
+        baseline = {}
+        if args.select and os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Saved %s' % args.baseline)
+    if args.compare:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        print()
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print('%d benchmark(s) more than %.2fx slower than baseline' % (len(slower), args.threshold))
+            exit(1)
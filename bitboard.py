@@ -0,0 +1,420 @@
+import random
+import time
+import unittest
+import minimax
+from minimax import Game, SearchStats
+
+# Alternative board backend for Game.
+#
+# The 5 x 5 board (the 3 x 3 playing field plus the cheat border) is stored
+# as two 25 bit integers, one for X and one for O. The cell at board
+# coordinates (x, y) (0-4, as used by is_occupied()) is bit y*5 + x.
+
+def bit(x, y):
+    return 1 << (y*5 + x)
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+INNER = 0
+for y in range(1, 4):
+    for x in range(1, 4):
+        INNER = INNER | bit(x, y)
+ALL = (1 << 25) - 1
+BORDER = ALL & ~INNER
+
+# Moves in the playing field, in the order Game.max_alpha_beta() tries them
+MOVES = [ (x, y, bit(x+1, y+1)) for y in range(0, 3) for x in range(0, 3) ]
+
+# minimax.CHEAT_SQUARES as (priority, x, y, bit)
+CHEATS = [ (prio, x, y, bit(x+1, y+1)) for (prio, x, y, lines) in minimax.CHEAT_SQUARES ]
+
+def line_mask(cells):
+    mask = 0
+    for (x, y) in cells:
+        mask = mask | bit(x, y)
+    return mask
+
+# minimax.LINES as (mask, c1, c2)
+LINES = [ (line_mask(cells), c1, c2) for (cells, c1, c2) in minimax.LINES ]
+MASKS = [ l[0] for l in LINES ]
+
+# minimax.LINES_THROUGH, keyed by the bit of the cell
+LINES_THROUGH = {}
+MASKS_THROUGH = {}
+for y in range(0, 5):
+    for x in range(0, 5):
+        LINES_THROUGH[bit(x, y)] = [ (line_mask(cells), c1, c2)
+                                     for (cells, c1, c2) in minimax.LINES_THROUGH[(x, y)] ]
+        MASKS_THROUGH[bit(x, y)] = [ l[0] for l in LINES_THROUGH[bit(x, y)] ]
+
+class BitGame(Game):
+    """
+    Game with the board stored as bitmasks. Same public API as Game, but
+    the search only supports the 'row' move ordering and no transposition
+    table, setting either raises an exception. Search statistics are kept.
+    """
+    def initialize_game(self):
+        self.x_mask = 0
+        self.o_mask = 0
+
+    def copy(self, other):
+        if isinstance(other, BitGame):
+            self.x_mask = other.x_mask
+            self.o_mask = other.o_mask
+        else:
+            self.load(other.get_board())
+        self.human_symbol = other.human_symbol
+        self.computer_symbol = other.computer_symbol
+        self.set_transposition_table(other.tt)
+        self.book = other.book
+        self.set_move_ordering(other.ordering)
+
+    def set_transposition_table(self, tt):
+        if tt is not None:
+            raise Exception('BitGame does not support a transposition table')
+        self.tt = tt
+
+    def set_move_ordering(self, ordering):
+        if ordering != 'row':
+            raise Exception('BitGame only supports the row move ordering, not %s' % ordering)
+        Game.set_move_ordering(self, ordering)
+
+    def load(self, board):
+        """
+        Set state from a 5 x 5 list as returned by Game.get_board()
+        """
+        self.initialize_game()
+        for y in range(0, 5):
+            for x in range(0, 5):
+                if board[y][x] == 'X':
+                    self.x_mask = self.x_mask | bit(x, y)
+                elif board[y][x] == 'O':
+                    self.o_mask = self.o_mask | bit(x, y)
+
+    def get_board(self):
+        board = []
+        for y in range(0, 5):
+            row = []
+            for x in range(0, 5):
+                b = bit(x, y)
+                if self.x_mask & b:
+                    row.append('X')
+                elif self.o_mask & b:
+                    row.append('O')
+                elif INNER & b:
+                    row.append('.')
+                else:
+                    row.append(' ')
+            board.append(row)
+        return board
+
+    def get_mask(self, symbol):
+        if symbol == 'X':
+            return self.x_mask
+        if symbol == 'O':
+            return self.o_mask
+        return 0
+
+    def is_valid(self, px, py, force=False):
+        if force:
+            if px < -1 or px > 3 or py < -1 or py > 3:
+                return False
+        elif px < 0 or px > 2 or py < 0 or py > 2:
+            return False
+        return not (self.x_mask | self.o_mask) & bit(px+1, py+1)
+
+    def is_occupied(self, x, y):
+        return bool((self.x_mask | self.o_mask) & bit(x, y))
+
+    def game_over(self):
+        return self._game_over(LINES)
+
+    def game_over_at(self, x, y):
+        return self._game_over(LINES_THROUGH[bit(x+1, y+1)])
+
+    def _game_over(self, lines):
+        x_mask = self.x_mask
+        o_mask = self.o_mask
+        for (mask, c1, c2) in lines:
+            if x_mask & mask == mask:
+                return ('X', c1, c2)
+            if o_mask & mask == mask:
+                return ('O', c1, c2)
+        if (x_mask | o_mask) & INNER == INNER:
+            return ('.', None, None)
+        return None
+
+    def last_round(self):
+        return popcount((self.x_mask | self.o_mask) & INNER) >= 7
+
+    def moves_left(self):
+        return 9 - popcount((self.x_mask | self.o_mask) & INNER)
+
+    def make_move(self, x, y, symbol, force=False):
+        if x is None or y is None:
+            self.show()
+            raise Exception('Illegal move: x %s y %s' % (str(x), str(y)))
+        if not self.is_valid(x, y, force):
+            raise Exception('Illegal move at (%d, %d)' % (x, y))
+        if symbol == 'X':
+            self.x_mask = self.x_mask | bit(x+1, y+1)
+        else:
+            self.o_mask = self.o_mask | bit(x+1, y+1)
+
+    def erase_move(self, x, y):
+        b = bit(x+1, y+1)
+        self.x_mask = self.x_mask & ~b
+        self.o_mask = self.o_mask & ~b
+
+    def max_alpha_beta(self, alpha, beta, last=None):
+        last = None if last is None else bit(last[0]+1, last[1]+1)
+        return self._max(self.get_mask(self.computer_symbol),
+                         self.get_mask(self.human_symbol), alpha, beta, last)
+
+    def min_alpha_beta(self, alpha, beta, last=None):
+        last = None if last is None else bit(last[0]+1, last[1]+1)
+        return self._min(self.get_mask(self.computer_symbol),
+                         self.get_mask(self.human_symbol), alpha, beta, last)
+
+    def _result(self, computer, human, last=None):
+        """
+        Return value of position if the game has ended, else None.
+        If last is given, only the lines through that bit are checked.
+        """
+        for mask in (MASKS if last is None else MASKS_THROUGH[last]):
+            if human & mask == mask:
+                return -1
+            if computer & mask == mask:
+                return 1
+        if (computer | human) & INNER == INNER:
+            return 0
+        return None
+
+    def timed_result(self, computer, human, last):
+        """
+        Return _result() for a node in the search, counting it in self.stats
+        """
+        start = time.perf_counter()
+        v = self._result(computer, human, last)
+        self.stats.game_over_time = self.stats.game_over_time + time.perf_counter() - start
+        self.stats.nodes = self.stats.nodes + 1
+        return v
+
+    def _max(self, computer, human, alpha, beta, last=None):
+        stats = self.stats
+        if stats is None:
+            v = self._result(computer, human, last)
+        else:
+            v = self.timed_result(computer, human, last)
+        if v is not None:
+            return (v, 0, 0)
+        if stats is not None:
+            stats.enter()
+        maxv = -2
+        px = None
+        py = None
+        occupied = computer | human
+        for (x, y, b) in MOVES:
+            if not occupied & b:
+                m = self._min(computer | b, human, alpha, beta, b)[0]
+                if m > maxv:
+                    maxv = m
+                    px = x
+                    py = y
+                if maxv >= beta:
+                    if stats is not None:
+                        stats.leave(cutoff=True)
+                    return (maxv, px, py)
+                if maxv > alpha:
+                    alpha = maxv
+        if stats is not None:
+            stats.leave()
+        return (maxv, px, py)
+
+    def _min(self, computer, human, alpha, beta, last=None):
+        stats = self.stats
+        if stats is None:
+            v = self._result(computer, human, last)
+        else:
+            v = self.timed_result(computer, human, last)
+        if v is not None:
+            return (v, 0, 0)
+        if stats is not None:
+            stats.enter()
+        minv = 2
+        qx = None
+        qy = None
+        occupied = computer | human
+        for (x, y, b) in MOVES:
+            if not occupied & b:
+                m = self._max(computer, human | b, alpha, beta, b)[0]
+                if m < minv:
+                    minv = m
+                    qx = x
+                    qy = y
+                if minv <= alpha:
+                    if stats is not None:
+                        stats.leave(cutoff=True)
+                    return (minv, qx, qy)
+                if minv < beta:
+                    beta = minv
+        if stats is not None:
+            stats.leave()
+        return (minv, qx, qy)
+
+    def threats(self, symbol):
+        mine = self.get_mask(symbol)
+        occupied = self.x_mask | self.o_mask
+        result = []
+        for (x, y, b) in MOVES:
+            if occupied & b:
+                continue
+            with_move = mine | b
+            for mask in MASKS_THROUGH[b]:
+                if with_move & mask == mask:
+                    result.append((x, y))
+                    break
+        return result
+
+    def get_cheating_moves(self):
+        computer = self.get_mask(self.computer_symbol)
+        occupied = self.x_mask | self.o_mask
+        won = self.game_won()
+        moves = []
+        for (prio, x, y, b) in CHEATS:
+            if occupied & b:
+                continue
+            if won:
+                moves.append((prio, x, y))
+                continue
+            with_move = computer | b
+            for mask in MASKS_THROUGH[b]:
+                if with_move & mask == mask:
+                    moves.append((prio, x, y))
+                    break
+        return moves
+
+def random_position(rng, border=False, min_moves=0):
+    """
+    Return a random 5 x 5 board, as returned by Game.get_board()
+    """
+    g = Game()
+    board = g.get_board()
+    cells = [ (x, y) for y in range(0, 5) for x in range(0, 5)
+              if border or board[y][x] == '.' ]
+    rng.shuffle(cells)
+    n = rng.randint(min_moves, len(cells))
+    for i in range(0, n):
+        (x, y) = cells[i]
+        board[y][x] = 'X' if i % 2 == 0 else 'O'
+    return board
+
+class TestBitGameMethods(unittest.TestCase):
+
+    def test_board_view(self):
+        g = Game()
+        b = BitGame()
+        self.assertEqual(b.get_board(), g.get_board())
+        g.set_human('O')
+        b.set_human('O')
+        for t in [ g, b ]:
+            t.make_human_move(1, 1)
+            t.make_computer_move(-1, 0, force=True)
+            t.make_computer_move(2, 3, force=True)
+        self.assertEqual(b.get_board(), g.get_board())
+        c = BitGame()
+        c.copy(g)
+        self.assertEqual(c.get_board(), g.get_board())
+
+    def test_illegal_move(self):
+        b = BitGame()
+        b.set_human('X')
+        b.make_human_move(0, 0)
+        with self.assertRaises(Exception):
+            b.make_human_move(0, 0)
+        with self.assertRaises(Exception):
+            b.make_human_move(-1, 0)
+        b.make_computer_move(-1, 0, force=True)
+
+    def test_same_as_game(self):
+        rng = random.Random(1)
+        for i in range(0, 500):
+            board = random_position(rng, border=True)
+            g = Game()
+            g.current_state = board
+            b = BitGame()
+            b.load(board)
+            go = g.game_over()
+            self.assertEqual(b.game_over(), go)
+            if go and go[0] != '.':
+                self.assertTrue(b.verify_winner(go))
+            self.assertEqual(b.last_round(), g.last_round())
+            self.assertEqual(b.moves_left(), g.moves_left())
+            for symbol in [ 'X', 'O' ]:
+                self.assertEqual(b.threats(symbol), g.threats(symbol))
+
+    def test_same_moves_as_game(self):
+        rng = random.Random(2)
+        for i in range(0, 100):
+            board = random_position(rng, min_moves=3)
+            g = Game()
+            g.current_state = board
+            g.set_human('O' if i % 2 else 'X')
+            if g.game_over():
+                continue
+            b = BitGame()
+            b.copy(g)
+            self.assertEqual(b.max_alpha_beta(-2, 2), g.max_alpha_beta(-2, 2))
+            self.assertEqual(b.get_human_move(), g.get_human_move())
+            self.assertEqual(b.get_cheating_moves(), g.get_cheating_moves())
+            self.assertEqual(b.get_computer_move(allow_early_cheat=True),
+                             g.get_computer_move(allow_early_cheat=True))
+
+    def test_search_hooks(self):
+        # Statistics are the same as Game's, unsupported hooks are refused
+        from transposition import TranspositionTable
+        g = Game()
+        b = BitGame()
+        for t in [ g, b ]:
+            # Search instead of taking the move from the book
+            t.book = None
+            t.set_human('O')
+            t.make_human_move(1, 1)
+        stats = [ SearchStats(), SearchStats() ]
+        self.assertEqual(b.get_computer_move(stats=stats[1]), g.get_computer_move(stats=stats[0]))
+        for attr in [ 'nodes', 'cutoffs', 'max_depth' ]:
+            self.assertEqual(getattr(stats[1], attr), getattr(stats[0], attr))
+        self.assertGreater(stats[1].nodes, 0)
+        with self.assertRaises(Exception):
+            b.set_transposition_table(TranspositionTable())
+        with self.assertRaises(Exception):
+            b.set_move_ordering('static')
+        g.set_move_ordering('killer')
+        with self.assertRaises(Exception):
+            BitGame().copy(g)
+        g.set_move_ordering('row')
+        b.copy(g)
+        self.assertEqual(b.ordering, 'row')
+
+    def test_find_best_move(self):
+        g = BitGame()
+        g.set_human('O')
+        g.make_human_move(1, 1)
+        (m, px, py, cheating) = g.get_computer_move()
+        g.make_computer_move(px, py)
+        g.make_human_move(0, 1)
+        (m, px, py, cheating) = g.get_computer_move()
+        # Computer must play (2, 1) to prevent human win
+        self.assertEqual(px, 2)
+        self.assertEqual(py, 1)
+
+if __name__ == "__main__":
+    # Compare search speed with Game
+    for cls in [ Game, BitGame ]:
+        g = cls()
+        g.set_human('O')
+        start = time.time()
+        g.max_alpha_beta(-2, 2)
+        print('%s: %.3f s' % (cls.__name__, time.time() - start))
+    unittest.main()
@@ -0,0 +1,86 @@
+import mmap
+import os
+import struct
+
+# Move book for the 3 x 3 game, generated by mkbook.py.
+#
+# For every position where the computer can be asked to move, the book holds
+# the result of Game.max_alpha_beta(-2, 2), so Game.get_computer_move() can
+# look the move up instead of searching.
+#
+# File layout: header (magic, version, positions per table), then one table
+# per human symbol ('X', then 'O'). A table has a byte per position, indexed
+# by the playing field read as a base 3 number ('.' = 0, 'X' = 1, 'O' = 2,
+# cell (0, 0) is the least significant digit). Each byte is
+# (value + 1) << 4 | (y*3 + x), or 0xFF if the position is not in the book.
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'minimax.book')
+MAGIC = b'XOBK'
+# Bump when the search changes, so old books are no longer used
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+POSITIONS = 3**9
+SYMBOLS = [ 'X', 'O' ]
+DIGITS = { '.': 0, 'X': 1, 'O': 2 }
+NONE = 0xFF
+
+def position_index(board):
+    """
+    Return index of the playing field of board (5 x 5 list),
+    or None if there are symbols in the border
+    """
+    for x in range(0, 5):
+        if board[0][x] != ' ' or board[4][x] != ' ':
+            return None
+    for y in range(1, 4):
+        if board[y][0] != ' ' or board[y][4] != ' ':
+            return None
+    index = 0
+    for y in range(3, 0, -1):
+        row = board[y]
+        index = index*27 + DIGITS[row[3]]*9 + DIGITS[row[2]]*3 + DIGITS[row[1]]
+    return index
+
+def encode(m, x, y):
+    return ((m + 1) << 4) | (y*3 + x)
+
+def decode(b):
+    return ((b >> 4) - 1, (b & 0xF) % 3, (b & 0xF) // 3)
+
+class Book:
+    def __init__(self, filename=BOOK_FILE):
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, positions) = HEADER.unpack_from(self.data)
+        if (magic != MAGIC or version != VERSION or positions != POSITIONS or
+            len(self.data) != HEADER.size + len(SYMBOLS)*POSITIONS):
+            self.data.close()
+            raise Exception('stale move book %s (version %d, expected %d)' % (filename, version, VERSION))
+
+    def lookup(self, game):
+        """
+        Return (m, x, y) as Game.max_alpha_beta(-2, 2) would, or None
+        """
+        index = position_index(game.get_board())
+        if index is None or game.human_symbol not in SYMBOLS:
+            return None
+        b = self.data[HEADER.size + SYMBOLS.index(game.human_symbol)*POSITIONS + index]
+        if b == NONE:
+            return None
+        return decode(b)
+
+default_book = None
+default_loaded = False
+
+def get_default():
+    """
+    Return the book in BOOK_FILE, or None if it is missing or stale
+    """
+    global default_book, default_loaded
+    if not default_loaded:
+        default_loaded = True
+        try:
+            default_book = Book()
+        except Exception as e:
+            print('Not using move book: %s' % e)
+    return default_book
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import cv2
+import numpy
+
+# Learned cell classifier, an alternative to the heuristics in
+# detect.detect_shape_contours() (select it with detect.BACKEND = 'learned').
+#
+# Each cell is reduced to a small feature vector: the fraction of ink, the
+# Hu moments of the ink and how the ink is spread over rings around the
+# cell centre (a cross has ink in the middle, a circle does not). Cells are
+# classified by their k nearest neighbours among the labelled cells in
+# refimgs/ and problems/, which are stored in MODEL_FILE:
+#
+#   python classifier.py --train     # after adding labelled cells
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classifier-model.json')
+# Increase when the features change, old models are then refused
+MODEL_VERSION = 2
+# Number of rings in the radial ink profile
+RINGS = 6
+# Number of neighbours that vote
+K = 3
+
+model = None
+model_lock = threading.Lock()
+rings = {}
+
+def get_rings(shape):
+    """
+    Return array of ring index for each pixel of a cell of this shape
+    """
+    if shape not in rings:
+        (h, w) = shape
+        (y, x) = numpy.mgrid[0:h, 0:w]
+        r = numpy.hypot(x - (w - 1)/2, y - (h - 1)/2)/(min(w, h)/2)
+        rings[shape] = numpy.minimum((r*RINGS).astype(numpy.intp), RINGS - 1)
+    return rings[shape]
+
+def get_ink(cell):
+    """
+    Return ink mask (uint8 0/1) of a grayscale cell, as thresholded by
+    detect_shape_contours(), or None if the cell is evenly filled
+    """
+    min = int(numpy.amin(cell))
+    max = int(numpy.amax(cell))
+    if max - min < 50:
+        return None
+    thr = int((min + max)/2)
+    ret, ink = cv2.threshold(cell, thr, 1, cv2.THRESH_BINARY_INV)
+    return ink
+
+def features(ink):
+    """
+    Return feature vector of an ink mask
+    """
+    n = int(numpy.count_nonzero(ink))
+    hu = cv2.HuMoments(cv2.moments(ink, True)).flatten()
+    # Log scale, the moments span many orders of magnitude. The sign and
+    # the exact value of tiny moments are just noise.
+    hu = -numpy.log10(numpy.maximum(numpy.abs(hu), 1e-12))/10
+    profile = numpy.bincount(get_rings(ink.shape).ravel(), weights=ink.ravel(), minlength=RINGS)
+    profile = profile/max(1, n)
+    return numpy.concatenate([ [ n/ink.size ], hu, profile ]).astype(numpy.float32)
+
+class Model:
+    def __init__(self, samples, labels, k=K, files=None, sources=None):
+        """
+        samples is an (n, features) array, labels a list of n symbols;
+        sources gives for each sample the index into files of the image it
+        was made from
+        """
+        self.samples = numpy.asarray(samples, dtype=numpy.float32)
+        self.labels = list(labels)
+        self.k = k
+        self.files = list(files or [])
+        self.sources = numpy.asarray(sources if sources is not None else [ -1 ]*len(self.labels))
+        self.mean = self.samples.mean(axis=0)
+        self.scale = self.samples.std(axis=0) + 1e-6
+        self.scaled = (self.samples - self.mean)/self.scale
+
+    def predict(self, feature, exclude=None):
+        """
+        Return symbol of the majority of the k nearest samples, the nearest
+        if there is a tie. Samples where exclude is True are skipped.
+        """
+        d = (((feature - self.mean)/self.scale - self.scaled)**2).sum(axis=1)
+        if exclude is not None:
+            d = numpy.where(exclude, numpy.inf, d)
+        nearest = numpy.argsort(d)[:self.k]
+        votes = {}
+        for i in nearest:
+            votes[self.labels[i]] = votes.get(self.labels[i], 0) + 1
+        best = max(votes.values())
+        for i in nearest:
+            if votes[self.labels[i]] == best:
+                return self.labels[i]
+
+    def held_out(self, path):
+        """
+        Return mask of the samples made from image path, None if there are none
+        """
+        path = os.path.normpath(path)
+        if path not in self.files:
+            return None
+        return self.sources == self.files.index(path)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({ 'version': MODEL_VERSION, 'k': self.k, 'rings': RINGS,
+                        'samples': self.samples.tolist(), 'labels': self.labels,
+                        'files': self.files, 'sources': self.sources.tolist() }, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        if saved['version'] != MODEL_VERSION:
+            raise Exception('%s is version %s, need %d: run classifier.py --train' %
+                            (path, saved['version'], MODEL_VERSION))
+        if saved['rings'] != RINGS:
+            raise Exception('%s has %s rings, need %d: run classifier.py --train' %
+                            (path, saved['rings'], RINGS))
+        return Model(saved['samples'], saved['labels'], saved['k'], saved['files'], saved['sources'])
+
+def get_model():
+    """
+    Return the model, loading it on first use. Cells are classified by
+    several threads, the lock makes sure it is only loaded once.
+    """
+    global model
+    with model_lock:
+        if model is None:
+            model = Model.load(MODEL_FILE)
+        return model
+
+def classify(cell, held_out=None):
+    """
+    Return '.', 'X' or 'O' for grayscale cell
+    If held_out is the path of a training image, classify as if the model
+    had been trained without it.
+    """
+    ink = get_ink(cell)
+    if ink is None:
+        return '.'
+    nonzero = int(numpy.count_nonzero(ink))
+    if nonzero > 2000:
+        raise Exception('filled cell detected (nz %d)' % nonzero)
+    if nonzero <= 100:
+        # As detect_shape_contours(), too little ink to be a symbol
+        return '.'
+    m = get_model()
+    exclude = m.held_out(held_out) if held_out else None
+    return m.predict(features(ink), exclude)
+
+def variants(cell):
+    """
+    Return the cell rotated and mirrored, X and O look the same either way
+    """
+    result = []
+    for flipped in [ cell, cv2.flip(cell, 1) ]:
+        for k in range(0, 4):
+            result.append(numpy.ascontiguousarray(numpy.rot90(flipped, k)))
+    return result
+
+def training_set(files, root='.'):
+    """
+    Return (samples, labels, sources) for (path, label) files under root,
+    sources is the index into files of each sample
+    """
+    samples = []
+    labels = []
+    sources = []
+    for (i, (path, label)) in enumerate(files):
+        cell = cv2.cvtColor(cv2.imread(os.path.join(root, path)), cv2.COLOR_BGR2GRAY)
+        for v in variants(cell):
+            ink = get_ink(v)
+            if ink is None:
+                continue
+            samples.append(features(ink))
+            labels.append(label)
+            sources.append(i)
+    return (numpy.array(samples), labels, numpy.array(sources))
+
+def leave_one_out(samples, labels, sources):
+    """
+    Return fraction of images classified correctly by a model trained on
+    the other images
+    """
+    m = Model(samples, labels)
+    correct = 0
+    n = 0
+    for source in numpy.unique(sources):
+        i = numpy.nonzero(sources == source)[0][0]
+        if m.predict(samples[i], exclude=sources == source) == labels[i]:
+            correct = correct + 1
+        n = n + 1
+    return correct/n
+
+def train(path=MODEL_FILE):
+    """
+    Train on the labelled cells found by corpus.py and save the model
+    """
+    import corpus
+    root = os.path.dirname(os.path.abspath(__file__))
+    files = corpus.corpus_files(root)
+    (samples, labels, sources) = training_set(files, root)
+    print('%d samples from %d images, leave one out accuracy %.1f%%' %
+          (len(samples), len(files), 100*leave_one_out(samples, labels, sources)))
+    m = Model(samples, labels, K, [ os.path.normpath(f) for (f, label) in files ], sources)
+    m.save(path)
+    print('Saved %s' % path)
+    return m
+
+class TestClassifier(unittest.TestCase):
+
+    def test_features(self):
+        cell = numpy.full((70, 70), 220, dtype=numpy.uint8)
+        self.assertIsNone(get_ink(cell))
+        cv2.circle(cell, (35, 35), 25, 30, 3)
+        f = features(get_ink(cell))
+        self.assertEqual(len(f), 1 + 7 + RINGS)
+        # No ink in the middle of a circle
+        self.assertEqual(f[8], 0)
+        self.assertAlmostEqual(f[8:].sum(), 1, places=5)
+        # Features do not depend on rotation
+        r = features(get_ink(numpy.ascontiguousarray(numpy.rot90(cell))))
+        self.assertTrue(numpy.allclose(f, r, atol=1e-3))
+
+    def test_model(self):
+        m = get_model()
+        self.assertEqual(len(m.samples), len(m.labels))
+        for (path, expected) in [ ('refimgs/006-cross.png', 'X'), ('refimgs/007-circle.png', 'O'),
+                                  ('refimgs/008-empty.png', '.') ]:
+            cell = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+            self.assertEqual(classify(cell), expected)
+
+    def test_synthetic(self):
+        cross = numpy.full((70, 70), 220, dtype=numpy.uint8)
+        cv2.line(cross, (12, 12), (58, 58), 30, 4)
+        cv2.line(cross, (12, 58), (58, 12), 30, 4)
+        self.assertEqual(classify(cross), 'X')
+        circle = numpy.full((70, 70), 220, dtype=numpy.uint8)
+        cv2.circle(circle, (35, 35), 24, 30, 4)
+        self.assertEqual(classify(circle), 'O')
+
+    def test_held_out(self):
+        m = get_model()
+        self.assertIsNone(m.held_out('refimgs/no-such-image.png'))
+        mask = m.held_out('refimgs/006-cross.png')
+        self.assertEqual(mask.sum(), 8)
+        cell = cv2.cvtColor(cv2.imread('refimgs/011-cross.png'), cv2.COLOR_BGR2GRAY)
+        self.assertEqual(classify(cell, 'refimgs/011-cross.png'), 'X')
+
+    def test_version(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'model.json')
+            Model(numpy.zeros((2, 3)), [ 'X', 'O' ]).save(path)
+            self.assertEqual(Model.load(path).labels, [ 'X', 'O' ])
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            for (key, value) in [ ('version', MODEL_VERSION - 1), ('rings', RINGS + 1) ]:
+                changed = dict(saved)
+                changed[key] = value
+                with open(path, 'w') as f:
+                    json.dump(changed, f)
+                with self.assertRaises(Exception):
+                    Model.load(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Learned cell classifier.')
+    parser.add_argument('-t', '--train', action='store_true', help='Train and save %s' % MODEL_FILE)
+    parser.add_argument('files', nargs='*', help='Cell images to classify')
+    args = parser.parse_args()
+    if args.train:
+        train()
+    for path in args.files:
+        cell = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        sym = classify(cell)
+        print('%s: %s (%.3f ms)' % (path, sym, 1000*(time.perf_counter() - start)))
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import time
+import unittest
+import cv2
+import detect
+from bench import percentile
+
+# Run every labelled cell image through detect.classify_cell() and report
+# how well, and how fast, it does:
+#
+#   python corpus.py -o before.json    # before changing detection
+#   python corpus.py -c before.json    # after, shows what changed
+#
+# refimgs/ are labelled by file name, the cells in problems/ by PROBLEMS.
+# The learned backend is trained on these same cells, so each cell is
+# classified as if the model had been trained without it (leave one image
+# out), otherwise it would just be recognising its training set.
+
+SYMBOLS = [ 'X', 'O', '.' ]
+HEURISTICS = [ 'crossing', 'circle', 'contour' ]
+
+# Correct symbol for the cells in problems/<name>/cell*raw.png
+PROBLEMS = {
+    'brokencircle': 'O',
+    'o-detected-as-x': 'O',
+    'o-detected-as-x-2': 'O',
+    'shadow': '.',
+}
+
+def get_label(path):
+    """
+    Return the correct symbol for the cell image in path, None if not known
+    """
+    problem = os.path.basename(os.path.dirname(path))
+    if problem in PROBLEMS:
+        return PROBLEMS[problem]
+    name = os.path.basename(path)
+    if 'cross' in name:
+        return 'X'
+    if 'circle' in name:
+        return 'O'
+    if 'empty' in name or 'shadow' in name:
+        return '.'
+    return None
+
+def corpus_files(root='.'):
+    """
+    Return sorted list of (path, label) of the labelled cell images
+    """
+    paths = glob.glob(os.path.join(root, 'refimgs', '*.png')) + \
+        glob.glob(os.path.join(root, 'problems', '*', 'cell*raw.png'))
+    files = []
+    for path in sorted(paths):
+        label = get_label(path)
+        if label:
+            files.append((os.path.relpath(path, root), label))
+    return files
+
+def classify(path, favour, repeat=1):
+    """
+    Run detect.classify_cell() on image in path, or for the learned
+    backend classifier.classify() without the samples made from path.
+    Returns (symbol, votes, seconds), symbol is 'error' if it failed.
+    """
+    if detect.BACKEND == 'learned':
+        import classifier
+    gray = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+    times = []
+    for i in range(0, repeat):
+        votes = {}
+        start = time.perf_counter()
+        try:
+            if detect.BACKEND == 'learned':
+                symbol = classifier.classify(gray, held_out=path)
+            else:
+                symbol = detect.classify_cell(0, 0, gray, favour, votes)
+        except Exception:
+            symbol = 'error'
+        times.append(time.perf_counter() - start)
+    return (symbol, votes, min(times))
+
+def run_corpus(files, repeat=1):
+    """
+    Classify (path, label) files without favour and favouring the label.
+    Returns list of dicts, one per file and mode.
+    """
+    results = []
+    for (path, label) in files:
+        for favour in [ None, label ]:
+            (symbol, votes, t) = classify(path, favour, repeat)
+            results.append({ 'file': path, 'label': label, 'favour': favour, 'symbol': symbol,
+                             'votes': votes, 'time': t })
+    return results
+
+def summarize(results):
+    """
+    Return dict with confusion matrix, votes per label and latency
+    percentiles for results from run_corpus()
+    """
+    confusion = dict([ (label, dict([ (s, 0) for s in SYMBOLS + [ 'error' ] ])) for label in SYMBOLS ])
+    votes = dict([ (h, dict([ (label, {}) for label in SYMBOLS ])) for h in HEURISTICS ])
+    correct = 0
+    for r in results:
+        confusion[r['label']][r['symbol']] = confusion[r['label']][r['symbol']] + 1
+        if r['symbol'] == r['label']:
+            correct = correct + 1
+        for h in HEURISTICS:
+            vote = str(r['votes'].get(h))
+            count = votes[h][r['label']]
+            count[vote] = count.get(vote, 0) + 1
+    times = [ r['time'] for r in results ]
+    return { 'backend': detect.BACKEND, 'cells': len(results), 'correct': correct,
+             'accuracy': correct/len(results) if results else 0,
+             'confusion': confusion, 'votes': votes,
+             'p50': percentile(times, 50), 'p90': percentile(times, 90),
+             'p99': percentile(times, 99), 'max': max(times) if times else 0 }
+
+def report(summary):
+    print('%s: %d of %d cells correct (%.1f%%)%s' %
+          (summary['backend'], summary['correct'], summary['cells'], 100*summary['accuracy'],
+           ', leaving each image out of the model' if summary['backend'] == 'learned' else ''))
+    print()
+    print('label \\ detected %s' % ''.join([ '%7s' % s for s in SYMBOLS + [ 'error' ] ]))
+    for label in SYMBOLS:
+        row = summary['confusion'][label]
+        print('%-16s %s' % (label, ''.join([ '%7d' % row[s] for s in SYMBOLS + [ 'error' ] ])))
+    print()
+    print('Votes (vote: cells) by label:')
+    for h in HEURISTICS:
+        for label in SYMBOLS:
+            counts = summary['votes'][h][label]
+            print('  %-9s %s  %s' % (h, label, '  '.join([ '%s: %d' % (v, counts[v]) for v in sorted(counts) ])))
+    print()
+    print('Latency per cell: p50 %.2f ms p90 %.2f ms p99 %.2f ms max %.2f ms' %
+          (1000*summary['p50'], 1000*summary['p90'], 1000*summary['p99'], 1000*summary['max']))
+
+def compare(results, old):
+    """
+    Print cells classified differently than in old (a saved run).
+    Returns number of cells that were correct in old but are not now.
+    """
+    before = dict([ ((r['file'], r['favour']), r) for r in old['results'] ])
+    worse = 0
+    for r in results:
+        o = before.get((r['file'], r['favour']))
+        if o is None or o['symbol'] == r['symbol']:
+            continue
+        if o['symbol'] == r['label']:
+            worse = worse + 1
+        print('%-45s favour %-4s %s -> %s (correct %s)' % (r['file'], r['favour'], o['symbol'], r['symbol'], r['label']))
+    s = old['summary']
+    print('Before: %d of %d correct, p50 %.2f ms p99 %.2f ms' % (s['correct'], s['cells'], 1000*s['p50'], 1000*s['p99']))
+    return worse
+
+class TestCorpus(unittest.TestCase):
+
+    def test_labels(self):
+        self.assertEqual(get_label('refimgs/006-cross.png'), 'X')
+        self.assertEqual(get_label('refimgs/000-incomplete-circle.png'), 'O')
+        self.assertEqual(get_label('refimgs/003-shadow.png'), '.')
+        self.assertEqual(get_label('problems/o-detected-as-x/cell31raw.png'), 'O')
+        self.assertEqual(get_label('problems/shadow/cell23raw.png'), '.')
+        self.assertIsNone(get_label('problems/o-outside-grid/out.png'))
+        files = corpus_files()
+        self.assertIn(('problems/brokencircle/cell11raw.png', 'O'), files)
+        self.assertNotIn('problems/brokencircle/cell11.png', [ f for (f, label) in files ])
+
+    def test_learned_held_out(self):
+        import classifier
+        # Every corpus image is in the model, and is left out when classified
+        self.assertEqual(sorted(classifier.get_model().files), sorted([ os.path.normpath(f) for (f, label) in corpus_files() ]))
+        backend = detect.BACKEND
+        try:
+            detect.BACKEND = 'learned'
+            summary = summarize(run_corpus(corpus_files()))
+        finally:
+            detect.BACKEND = backend
+        self.assertEqual(summary['backend'], 'learned')
+        self.assertGreater(summary['accuracy'], 0.9)
+
+    def test_refimgs(self):
+        # The unit tests in detect.py pass all of refimgs/
+        files = [ (f, label) for (f, label) in corpus_files() if f.startswith('refimgs') ]
+        results = run_corpus(files)
+        summary = summarize(results)
+        self.assertEqual(summary['cells'], 2*len(files))
+        self.assertEqual(summary['correct'], summary['cells'])
+        for r in results:
+            if r['symbol'] == 'X':
+                self.assertTrue(r['votes']['crossing'] or r['votes']['contour'] == 'X')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure symbol detection on the labelled cell images.')
+    parser.add_argument('-o', '--output', help='Save results as JSON')
+    parser.add_argument('-c', '--compare', help='Compare with results saved with --output')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Time each cell as best of this many runs (default 5)')
+    parser.add_argument('-b', '--backend', choices=[ 'heuristic', 'learned' ], default=detect.BACKEND,
+                        help='Cell classifier (default %s)' % detect.BACKEND)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show result for each cell')
+    args = parser.parse_args()
+    detect.BACKEND = args.backend
+    results = run_corpus(corpus_files(), args.repeat)
+    if args.verbose:
+        for r in results:
+            print('%-45s favour %-4s %s %s %s %.2f ms' % (r['file'], r['favour'], r['label'], r['symbol'],
+                                                          r['votes'], 1000*r['time']))
+    summary = summarize(results)
+    report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({ 'results': results, 'summary': summary }, f, indent=2)
+        print('Saved %s' % args.output)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            old = json.load(f)
+        print()
+        if compare(results, old):
+            exit(1)
@@ -1,16 +1,36 @@
+import concurrent.futures
 import cv2
 import numpy
-import math
 import statistics
 import unittest
-from shapely.geometry import LineString, Point
+import imagesink
+import xolog
 from minimax import Game
 
 DEBUG = True
 SILLYDEBUG = False
 
-def to_tuple(ls):
-    return tuple([ls.coords[0], ls.coords[1]])
+log = xolog.get_logger(__name__)
+
+# Number of threads classifying cells in detect_symbols(), 1 for none.
+# The OpenCV calls release the GIL, so threads run in parallel.
+WORKERS = 1
+executor = None
+# Number of threads in executor
+executor_workers = 0
+
+# A pixel has changed since the previous picture if it differs by more than
+# PIXEL_THRESHOLD, a cell if more than CHANGE_THRESHOLD of its pixels have
+PIXEL_THRESHOLD = 50
+CHANGE_THRESHOLD = 0.02
+
+# Cell classifier used by detect_symbols(): 'heuristic' for
+# detect_shape_contours(), 'learned' for classifier.classify()
+BACKEND = 'heuristic'
+
+# detect_grid() takes the background colour from every BACKGROUND_STEP'th
+# row and column of the picture, 1 to look at all pixels
+BACKGROUND_STEP = 1
 
 def to_list(t):
     return (int(t[0]), int(t[1]))
@@ -29,21 +49,89 @@ def quantize(img, nof_colors):
     quantized = res.reshape((img.shape))
     return quantized
 
+def classify_segments(lines, min_length, max_dev):
+    """
+    Split HoughLinesP() output into horizontal and vertical segments,
+    at least min_length long and deviating at most max_dev pixels.
+    Returns two (n, 4) float arrays of x1, y1, x2, y2.
+    """
+    segments = numpy.asarray(lines).reshape(-1, 4).astype(numpy.float64)
+    dx = numpy.abs(segments[:, 0] - segments[:, 2])
+    dy = numpy.abs(segments[:, 1] - segments[:, 3])
+    is_h = (dx >= min_length) & (dy < max_dev)
+    is_v = ~is_h & (dy >= min_length) & (dx < max_dev)
+    if SILLYDEBUG:
+        for (segment, h, v) in zip(segments, is_h, is_v):
+            print("line: %d, %d, %d, %d: %s" % (segment[0], segment[1], segment[2], segment[3],
+                                                 'H' if h else 'V' if v else 'skip'))
+    return (segments[is_h], segments[is_v])
+
+def find_crossings(horizontal, vertical, min_extend):
+    """
+    Find pairs of crossing segments that both extend at least min_extend
+    beyond the crossing point, for (n, 4) arrays of x1, y1, x2, y2.
+    Returns boolean arrays telling which horizontal and vertical segments
+    are part of such a pair.
+    """
+    h = horizontal[:, :, None]
+    v = vertical.T[None, :, :]
+    # Segments are h1 + t*r and v1 + u*s, crossing where 0 <= t, u <= 1
+    rx = h[:, 2] - h[:, 0]
+    ry = h[:, 3] - h[:, 1]
+    sx = v[:, 2] - v[:, 0]
+    sy = v[:, 3] - v[:, 1]
+    qx = v[:, 0] - h[:, 0]
+    qy = v[:, 1] - h[:, 1]
+    den = rx*sy - ry*sx
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = (qx*sy - qy*sx)/den
+        u = (qx*ry - qy*rx)/den
+        cx = h[:, 0] + t*rx
+        cy = h[:, 1] + t*ry
+    # Parallel segments (den == 0) are never counted as crossing
+    crossing = (den != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    with numpy.errstate(invalid='ignore'):
+        for (x, y) in [ (h[:, 0], h[:, 1]), (h[:, 2], h[:, 3]), (v[:, 0], v[:, 1]), (v[:, 2], v[:, 3]) ]:
+            crossing = crossing & (numpy.hypot(x - cx, y - cy) >= min_extend)
+    if SILLYDEBUG:
+        for (i, j) in zip(*numpy.nonzero(crossing)):
+            print("cross: %s, %s" % (horizontal[i], vertical[j]))
+    return (crossing.any(axis=1), crossing.any(axis=0))
+
+def background_colour(image, step=1):
+    """
+    Return the most common colour in image as (b, g, r), the lowest if
+    several are equally common, like numpy.unique(..., axis=0) would.
+    Only every step'th row and column is looked at.
+    """
+    pixels = image[::step, ::step].reshape(-1, image.shape[-1])
+    # Pack each colour into one int that sorts in the same order
+    keys = (pixels[:, 0].astype(numpy.uint32) << 16) | (pixels[:, 1].astype(numpy.uint32) << 8) | pixels[:, 2]
+    values, counts = numpy.unique(keys, return_counts=True)
+    key = int(values[counts.argmax()])
+    return (key >> 16, (key >> 8) & 255, key & 255)
+
+def segment_tuples(segments):
+    """
+    Return set of ((x1, y1), (x2, y2)) for (n, 4) array of segments
+    """
+    return set([ ((x1, y1), (x2, y2)) for (x1, y1, x2, y2) in segments.tolist() ])
+
 # Find grid in an image
 def detect_grid(input, min_length):
     gray = cv2.cvtColor(input, cv2.COLOR_BGR2GRAY)
 
     if DEBUG:
-        cv2.imwrite('png/gray.png', gray)
+        imagesink.imwrite('png/gray.png', gray)
 
     blur = cv2.medianBlur(gray, 5)
     if DEBUG:
-        cv2.imwrite('png/blur.png', blur)
+        imagesink.imwrite('png/blur.png', blur)
     thresh_type = cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
     ret, bin_img = cv2.threshold(gray, 128, 255, thresh_type)
-    print("Threshold: %d" % ret)
+    log.debug("Threshold: %d", ret)
     if DEBUG:
-        cv2.imwrite('png/bin.png', bin_img)
+        imagesink.imwrite('png/bin.png', bin_img)
 
     rho = 1  # distance resolution in pixels of the Hough grid
     theta = numpy.pi / 180  # angular resolution in radians of the Hough grid
@@ -61,68 +149,15 @@ def detect_grid(input, min_length):
     line_image = numpy.copy(input) * 0  # creating a blank to draw lines on
 
     MAX_DEV = 70 # max deviation from horizontal/vertical
-    horizontal = []
-    vertical = []
-    neither = []
-
-    for line in lines:
-        for x1, y1, x2, y2 in line:
-            dx = abs(x1 - x2)
-            dy = abs(y1 - y2)
-            if SILLYDEBUG:
-                print("line: %d, %d, %d, %d" % (x1, y1, x2, y2))
-            p1 = Point(x1, y1)
-            p2 = Point(x2, y2)
-            ls = LineString([p1, p2])
-            if dx >= min_length and dy < MAX_DEV:
-                # horizontal
-                if SILLYDEBUG:
-                    print("H")
-                horizontal.append(ls)
-            elif dy >= min_length and dx < MAX_DEV:
-                # vertical
-                if SILLYDEBUG:
-                    print("V")
-                vertical.append(ls)
-            else:
-                # neither
-                if SILLYDEBUG:
-                    print("skip")
-                neither.append(ls)
-
-    horizontal_c = set()
-    vertical_c = set()
-    other = set()
+    (horizontal, vertical) = classify_segments(lines, min_length, MAX_DEV)
 
     # minimum extension beyond crossing point
     MIN_EXTEND = 40
 
     # Find line that cross and are sufficiently long
-    for h in horizontal:
-        for v in vertical:
-            c = h.intersection(v)
-            is_crossing = False
-            if c:
-                if SILLYDEBUG:
-                    print("hline: %s -> %s" % (h.coords[0], h.coords[1]))
-                    print("vline: %s -> %s" % (v.coords[0], v.coords[1]))
-                    print("cross: %s" % c)
-                dist1 = Point(h.coords[0]).distance(c)
-                dist2 = Point(h.coords[1]).distance(c)
-                dist3 = Point(v.coords[0]).distance(c)
-                dist4 = Point(v.coords[1]).distance(c)
-                if (dist1 >= MIN_EXTEND and dist2 >= MIN_EXTEND and
-                    dist3 >= MIN_EXTEND and dist4 >= MIN_EXTEND):
-                    is_crossing = True
-                else:
-                    if SILLYDEBUG:
-                        print("no: %d %d %d %d" % (dist1, dist2, dist3, dist4))
-            if is_crossing:
-                horizontal_c.add(to_tuple(h)) # LineString is not hashable
-                vertical_c.add(to_tuple(v))
-            else:
-                other.add(to_tuple(h))
-                other.add(to_tuple(v))
+    (h_crossing, v_crossing) = find_crossings(horizontal, vertical, MIN_EXTEND)
+    horizontal_c = segment_tuples(horizontal[h_crossing])
+    vertical_c = segment_tuples(vertical[v_crossing])
 
     # Draw H and V lines
     for h in horizontal_c:
@@ -163,19 +198,14 @@ def detect_grid(input, min_length):
     y2mode = statistics.mode(y2s)
     xx = (x1mode, x2mode)
     yy = (y1mode, y2mode)
-    print("X %d - %d" % xx)
-    print("Y %d - %d" % yy)
+    log.info("X %d - %d, Y %d - %d", xx[0], xx[1], yy[0], yy[1])
     cv2.rectangle(line_image, (xx[0], yy[0]), (xx[1], yy[1]), (0, 0, 255), 1)
 
     # Add lines to the original image
     lines_edges = cv2.addWeighted(input, 0.8, line_image, 1, 0)
 
-    # Remove lines:
-    # 1) Find unique colours
-    colors, count = numpy.unique(input.reshape(-1, input.shape[-1]), axis=0, return_counts=True)
-    # 2) Use most common colour as background
-    background = colors[count.argmax()]
-    background = (int(background[0]), int(background[1]), int(background[2]))
+    # Remove lines, painting them in the most common colour
+    background = background_colour(input, BACKGROUND_STEP)
 
     nolines = input
     for h in horizontal_c:
@@ -186,16 +216,56 @@ def detect_grid(input, min_length):
 
     return (horizontal_c, vertical_c, xx, yy, lines_edges, nolines)
 
-def detect_shape_contours(grid_x, grid_y, cell, favour=None):
+def find_crossing(segments, min_extend, min_angle):
+    """
+    Find two segments (rows of x1, y1, x2, y2) that cross at an angle of more
+    than min_angle degrees, both extending at least min_extend beyond the
+    crossing point. Returns (i, j) for the first such pair, or None.
+    """
+    s = numpy.asarray(segments, dtype=numpy.float64).reshape(-1, 4)
+    # Direction of each segment, and the angle between every ordered pair
+    a = numpy.degrees(numpy.arctan2(s[:, 1] - s[:, 3], s[:, 0] - s[:, 2]))
+    adiff = (a[:, None] - a[None, :] + 180) % 360 - 180
+    # Only pairs at a large enough angle need to be intersected
+    (i, j) = numpy.nonzero(adiff > min_angle)
+    if len(i) == 0:
+        return None
+    p = s[i]
+    q = s[j]
+    # Segments are p1 + t*r and q1 + u*v, crossing where 0 <= t, u <= 1
+    rx = p[:, 2] - p[:, 0]
+    ry = p[:, 3] - p[:, 1]
+    vx = q[:, 2] - q[:, 0]
+    vy = q[:, 3] - q[:, 1]
+    wx = q[:, 0] - p[:, 0]
+    wy = q[:, 1] - p[:, 1]
+    den = rx*vy - ry*vx
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = (wx*vy - wy*vx)/den
+        u = (wx*ry - wy*rx)/den
+        cx = p[:, 0] + t*rx
+        cy = p[:, 1] + t*ry
+    ok = (den != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    with numpy.errstate(invalid='ignore'):
+        for (x, y) in [ (p[:, 0], p[:, 1]), (p[:, 2], p[:, 3]), (q[:, 0], q[:, 1]), (q[:, 2], q[:, 3]) ]:
+            ok = ok & (numpy.hypot(x - cx, y - cy) >= min_extend)
+    if not ok.any():
+        return None
+    k = ok.argmax()
+    return (int(i[k]), int(j[k]))
+
+def detect_shape_contours(grid_x, grid_y, cell, favour=None, votes=None):
     """
     Return '.', 'X' or 'O'
+    If votes is a dict, the votes of the heuristics are stored in it
+    under 'crossing', 'circle' and 'contour'.
     """
     if SILLYDEBUG:
         cv2.imwrite("png/cell%d%draw.png" % (grid_x, grid_y), cell)
 
     min = int(numpy.amin(cell))
     max = int(numpy.amax(cell))
-    print('cell%d%d: %d - %d' % (grid_x, grid_y, min, max))
+    log.debug('cell%d%d: %d - %d', grid_x, grid_y, min, max)
     if max - min < 50:
         # Evenly filled cell
         return '.'
@@ -207,7 +277,7 @@ def detect_shape_contours(grid_x, grid_y, cell, favour=None):
     height, width = thresh.shape[:2]
     nonzero = height*width - cv2.countNonZero(thresh)
     if nonzero > 2000:
-        print('Fatal error: filled cell detected (thr %d nz %d)' % (thr, nonzero))
+        log.error('filled cell detected (thr %d nz %d)', thr, nonzero)
         raise Exception('filled cell detected (thr %d nz %d)' % (thr, nonzero))
 
     # Heuristic #1: Detect lines crossing at an angle larger than MIN_ANGLE degrees
@@ -228,54 +298,22 @@ def detect_shape_contours(grid_x, grid_y, cell, favour=None):
     lines = cv2.HoughLinesP(edges, rho, theta, threshold, numpy.array([]),
                             min_line_length, max_line_gap)
     if lines is not None:
-        segments = []
-        line_image = cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
-        for line in lines:
-            if SILLYDEBUG:
-                print('line:', line)
-                cv2.line(line_image, (line[0][0], line[0][1]),
-                         (line[0][2], line[0][3]), (0, 255, 0), 1)
-            x1 = line[0][0]
-            y1 = line[0][1]
-            x2 = line[0][2]
-            y2 = line[0][3]
-            p1 = Point(x1, y1)
-            p2 = Point(x2, y2)
-            ls = LineString([p1, p2])
-            segments.append(ls)
+        segments = lines.reshape(-1, 4)
         if SILLYDEBUG:
+            line_image = cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
+            for (x1, y1, x2, y2) in segments:
+                print('line:', (x1, y1, x2, y2))
+                cv2.line(line_image, (x1, y1), (x2, y2), (0, 255, 0), 1)
             cv2.imwrite('png/hough-crossing.png', line_image)
-        for i in range(0, len(segments)):
-            for j in range(0, len(segments)):
-                isect = segments[i].intersection(segments[j])
-                if i != j and isect:
-                    if SILLYDEBUG:
-                        print('intersection: %d %d' % (i, j))
-                    # The lines intersect. Check how much they extend beyond the intersection point.
-                    i_coords = segments[i].coords
-                    j_coords = segments[j].coords
-                    dist1 = Point(i_coords[0]).distance(isect)
-                    dist2 = Point(i_coords[1]).distance(isect)
-                    dist3 = Point(j_coords[0]).distance(isect)
-                    dist4 = Point(j_coords[1]).distance(isect)
-                    if (dist1 >= MIN_EXTEND and dist2 >= MIN_EXTEND and
-                        dist3 >= MIN_EXTEND and dist4 >= MIN_EXTEND):
-                        # The lines extend sufficiently. Check that they cross at more or less a right angle.
-                        dx1 = i_coords[0][0] - i_coords[1][0]
-                        dy1 = i_coords[0][1] - i_coords[1][1]
-                        dx2 = j_coords[0][0] - j_coords[1][0]
-                        dy2 = j_coords[0][1] - j_coords[1][1]
-                        a1 = math.degrees(math.atan2(dy1, dx1))
-                        a2 = math.degrees(math.atan2(dy2, dx2))
-                        adiff = (a1 - a2 + 180) % 360 - 180
-                        if adiff > MIN_ANGLE:
-                            if SILLYDEBUG:
-                                print('intersect: %d, %d - %f/%f %d' % (i, j, a1, a2, adiff))
-                            if SILLYDEBUG:
-                                cv2.line(line_image, to_list(i_coords[0]), to_list(i_coords[1]), (0, 255, 255), 3)
-                                cv2.line(line_image, to_list(j_coords[0]), to_list(j_coords[1]), (0, 255, 0), 3)
-                                cv2.imwrite('png/hough-crossing.png', line_image)
-                            crossings_vote = 'X'
+        crossing = find_crossing(segments, MIN_EXTEND, MIN_ANGLE)
+        if crossing:
+            (i, j) = crossing
+            if SILLYDEBUG:
+                print('intersect: %d, %d' % (i, j))
+                cv2.line(line_image, to_list(segments[i][0:2]), to_list(segments[i][2:4]), (0, 255, 255), 3)
+                cv2.line(line_image, to_list(segments[j][0:2]), to_list(segments[j][2:4]), (0, 255, 0), 3)
+                cv2.imwrite('png/hough-crossing.png', line_image)
+            crossings_vote = 'X'
 
     # Heuristic #2: Detect circle with center reasonable near the image center with reasonable radius
     ###############
@@ -304,15 +342,17 @@ def detect_shape_contours(grid_x, grid_y, cell, favour=None):
         if radius >= min_radius:
             circles = numpy.uint16(numpy.around(circles))
             c = circles[0][0]
-            print(c)
+            log.debug('circle %s', c)
             x = c[0]
             y = c[1]
-            # draw the outer circle
-            cv2.circle(cell, (x, y), int(radius), (0,255,0), 2)
-            # draw the center of the circle
-            cv2.circle(cell, (x, y), 2, (0,0,255), 3)
             if SILLYDEBUG:
-                cv2.imwrite('png/hough-circles.png', cell)
+                # Draw on a copy, cell is part of the caller's picture
+                circle_image = cell.copy()
+                # draw the outer circle
+                cv2.circle(circle_image, (x, y), int(radius), (0,255,0), 2)
+                # draw the center of the circle
+                cv2.circle(circle_image, (x, y), 2, (0,0,255), 3)
+                cv2.imwrite('png/hough-circles.png', circle_image)
             xdiff = abs(width/2 - x)
             ydiff = abs(height/2 - y)
             if SILLYDEBUG:
@@ -365,8 +405,12 @@ def detect_shape_contours(grid_x, grid_y, cell, favour=None):
                 print('bounding box aspect ratio: %f' % bbar)
             if bbar > 4:
                 contour_vote = None
-    print("cell%d%d: nz %d thr %d sol %f -> %s X %s O %s" % (grid_x, grid_y, nonzero, thr, solidity,
-                                                             contour_vote, crossings_vote, circle_vote))
+    log.debug("cell%d%d: nz %d thr %d sol %f -> %s X %s O %s", grid_x, grid_y, nonzero, thr, solidity,
+              contour_vote, crossings_vote, circle_vote)
+    if votes is not None:
+        votes['crossing'] = crossings_vote
+        votes['circle'] = circle_vote
+        votes['contour'] = contour_vote
     if crossings_vote:
         return crossings_vote
     if circle_vote > 1:
@@ -375,22 +419,75 @@ def detect_shape_contours(grid_x, grid_y, cell, favour=None):
         return contour_vote
     return 'O' if circle_vote else '.'
 
-def detect_symbols(pic, xx, yy, board, favour=None):
+def classify_cell(grid_x, grid_y, cell, favour=None, votes=None):
+    """
+    Return '.', 'X' or 'O' for cell, using BACKEND
+    """
+    if BACKEND == 'learned':
+        import classifier
+        sym = classifier.classify(cell)
+        log.debug('cell%d%d: learned -> %s', grid_x, grid_y, sym)
+        return sym
+    return detect_shape_contours(grid_x, grid_y, cell, favour, votes)
+
+def get_executor(workers):
+    """
+    Return the persistent thread pool for detect_symbols(), with workers threads
+    """
+    global executor, executor_workers
+    if executor is None or executor_workers != workers:
+        if executor:
+            executor.shutdown()
+        executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='detect')
+        executor_workers = workers
+    return executor
+
+def classify_cells(cells, favour, workers):
+    """
+    Return list of symbols for list of (x, y, cell), using workers threads
+    """
+    if workers > 1 and len(cells) > 1:
+        pool = get_executor(workers)
+        futures = [ pool.submit(classify_cell, x, y, cell, favour) for (x, y, cell) in cells ]
+        # Collect in grid order, so the first failing cell raises as without threads
+        return [ f.result() for f in futures ]
+    return [ classify_cell(x, y, cell, favour) for (x, y, cell) in cells ]
+
+def detect_symbols(pic, xx, yy, board, favour=None, workers=None, previous=None, scores=None):
     """
     Return 5 x 5 array with X, O or None
+    Empty cells are classified by workers threads (default WORKERS).
+    If previous, the picture from the last turn, is given, empty cells that
+    have changed since are classified first; the others only if that finds
+    no symbol. If scores is a list, it is set to a 5 x 5 array with the
+    fraction of changed pixels for empty cells, None for the others.
     """
-    print("detect_symbols: %s, %s" % (xx, yy))
+    log.info("detect_symbols: %s, %s", xx, yy)
     grid_pic = pic[yy[0]:yy[1], xx[0]:xx[1]]
-    cv2.imwrite("png/grid_pic.png", grid_pic)
+    imagesink.imwrite("png/grid_pic.png", grid_pic)
+    if workers is None:
+        workers = WORKERS
+    changed = None
+    if previous is not None:
+        if previous.shape == pic.shape:
+            previous_grid = previous[yy[0]:yy[1], xx[0]:xx[1]]
+            changed = cv2.absdiff(grid_pic, previous_grid) > PIXEL_THRESHOLD
+        else:
+            log.warning('Previous picture has size %s, not %s', previous.shape, pic.shape)
 
     dx = (xx[1] - xx[0])/5
     dy = (yy[1] - yy[0])/5
     MARGIN=10
     symbols = []
+    cell_scores = []
+    cells = []
+    unchanged = []
     for y in range(0, 5):
         row = []
+        score_row = []
         for x in range(0, 5):
             sym = board[y][x]
+            score = None
             if sym == '.':
                 y1 = int(y*dy)
                 y2 = int((y+1)*dy)
@@ -401,16 +498,105 @@ def detect_symbols(pic, xx, yy, board, favour=None):
                 #    # Left column
                 #    x1 = x1 - MARGIN
                 cell = grid_pic[y1+MARGIN:y2-MARGIN, x1+MARGIN:x2-MARGIN]
-                print('Cell %d, %d -> %d, %d' % (x1+MARGIN, y1+MARGIN, x2-MARGIN, y2-MARGIN))
-                sym = detect_shape_contours(x, y, cell, favour)
+                if changed is None:
+                    score = 1.0
+                else:
+                    cell_changed = changed[y1+MARGIN:y2-MARGIN, x1+MARGIN:x2-MARGIN]
+                    score = numpy.count_nonzero(cell_changed)/max(1, cell_changed.size)
+                if score > CHANGE_THRESHOLD:
+                    log.debug('Cell %d, %d -> %d, %d', x1+MARGIN, y1+MARGIN, x2-MARGIN, y2-MARGIN)
+                    cells.append((x, y, cell))
+                else:
+                    unchanged.append((x, y, cell))
             else:
-                print('Skip (%d, %d): %c' % (x, y, sym))
+                log.debug('Skip (%d, %d): %c', x, y, sym)
             row.append(sym)
+            score_row.append(score)
         symbols.append(row)
+        cell_scores.append(score_row)
+    if scores is not None:
+        scores[:] = cell_scores
+    if changed is not None:
+        log.info('Cell changes: %s', [ [ '-' if s is None else '%.3f' % s for s in row ] for row in cell_scores ])
+    results = classify_cells(cells, favour, workers)
+    if unchanged and all([ sym == '.' for sym in results ]):
+        # Nothing new where the picture changed (a shadow, a hand), the
+        # symbol may be in a cell that changed less: look at all of them
+        log.info('No symbol in %d changed cells, classifying the other %d', len(cells), len(unchanged))
+        cells = cells + unchanged
+        results = results + classify_cells(unchanged, favour, workers)
+    for ((x, y, cell), sym) in zip(cells, results):
+        symbols[y][x] = sym
     return symbols
 
+def make_grid_pic(images, size=110, margin=10):
+    """
+    Return grayscale 5 x 5 grid picture, with the images (5 x 5 list of
+    file names or None) in the cells, for testing detect_symbols()
+    """
+    pic = numpy.full((5*size, 5*size), 255, dtype=numpy.uint8)
+    for y in range(0, 5):
+        for x in range(0, 5):
+            if images[y][x]:
+                cell = cv2.cvtColor(cv2.imread(images[y][x]), cv2.COLOR_BGR2GRAY)
+                # Pad or crop to the cell size
+                n = size - 2*margin
+                (h, w) = cell.shape
+                cell = cv2.copyMakeBorder(cell, 0, max(0, n - h), 0, max(0, n - w), cv2.BORDER_REPLICATE)[:n, :n]
+                pic[y*size+margin:(y+1)*size-margin, x*size+margin:(x+1)*size-margin] = cell
+    return pic
+
+# Cell images (about 90 x 90 pixels), for tests and benchmarks
+GRID_IMAGES = [ [ 'refimgs/000-incomplete-circle.png', 'refimgs/031-cross.png', None,
+                  'refimgs/027-circle.png', 'refimgs/011-cross.png' ],
+                [ 'refimgs/016-cross.png', 'refimgs/026-circle.png', 'refimgs/017-cross.png',
+                  'refimgs/010-circle.png', 'refimgs/019-cross.png' ],
+                [ 'refimgs/012-circle.png', 'refimgs/022-cross.png', 'refimgs/013-circle.png',
+                  'refimgs/024-cross.png', 'refimgs/014-circle.png' ],
+                [ 'refimgs/025-cross.png', 'refimgs/015-circle.png', 'refimgs/028-cross.png',
+                  'refimgs/018-circle.png', 'refimgs/029-cross.png' ],
+                [ 'refimgs/020-circle.png', 'refimgs/030-cross.png', 'refimgs/021-circle.png',
+                  'refimgs/032-cross.png', 'refimgs/023-circle.png' ] ]
+
 class TestDetectMethods(unittest.TestCase):
 
+    def setUp(self):
+        # detect_symbols() writes png/grid_pic.png, not wanted from tests
+        self.encoding = imagesink.ENCODING
+        imagesink.ENCODING = 'off'
+
+    def tearDown(self):
+        imagesink.ENCODING = self.encoding
+
+    def test_detect_symbols_workers(self):
+        pic = make_grid_pic(GRID_IMAGES)
+        board = [ [ '.' ]*5 for y in range(0, 5) ]
+        board[0][0] = 'X'
+        xx = (0, pic.shape[1])
+        yy = (0, pic.shape[0])
+        expected = detect_symbols(pic.copy(), xx, yy, board, workers=1)
+        self.assertEqual(expected[0][0], 'X')
+        for y in range(0, 5):
+            for x in range(0, 5):
+                f = GRID_IMAGES[y][x] or ''
+                if (x, y) != (0, 0):
+                    self.assertEqual(expected[y][x], 'X' if 'cross' in f else 'O' if 'circle' in f else '.')
+        for workers in [ 2, 4, 4 ]:
+            self.assertEqual(detect_symbols(pic.copy(), xx, yy, board, workers=workers), expected)
+
+    def test_find_crossing(self):
+        # A cross, and a T whose stem does not extend beyond the bar
+        cross = [ [ 10, 10, 90, 90 ], [ 10, 90, 90, 10 ] ]
+        t = [ [ 10, 10, 90, 10 ], [ 50, 10, 50, 90 ] ]
+        self.assertEqual(find_crossing(cross, 20, 70), (0, 1))
+        self.assertIsNone(find_crossing(cross, 60, 70))
+        self.assertIsNone(find_crossing(t, 20, 70))
+        # Shallow angle
+        self.assertIsNone(find_crossing([ [ 10, 40, 90, 60 ], [ 10, 60, 90, 40 ] ], 20, 70))
+        # Parallel and collinear
+        self.assertIsNone(find_crossing([ [ 10, 10, 90, 10 ], [ 20, 10, 80, 10 ] ], 5, 70))
+        self.assertIsNone(find_crossing([ [ 10, 10, 90, 90 ] ], 5, 70))
+
     def t_detect_symbol(self, image, expected):
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         sym = detect_shape_contours(0, 0, gray)
@@ -460,7 +646,111 @@ class TestDetectMethods(unittest.TestCase):
     def test_empty(self):
         self.t_detect_symbol(cv2.imread('refimgs/003-shadow.png'), '.')
         self.t_detect_symbol(cv2.imread('refimgs/008-empty.png'), '.')
-        
+
+    def test_detect_changed_symbols(self):
+        pic = make_grid_pic(GRID_IMAGES)
+        xx = (0, pic.shape[1])
+        yy = (0, pic.shape[0])
+        board = [ [ '.' ]*5 for y in range(0, 5) ]
+        board[3][3] = 'O'
+        # Cell (1, 2) is new, and there is some noise
+        images = [ list(row) for row in GRID_IMAGES ]
+        images[2][1] = None
+        previous = make_grid_pic(images)
+        rng = numpy.random.default_rng(1)
+        pic = cv2.add(pic, rng.integers(0, 20, pic.shape, dtype=numpy.uint8))
+        scores = []
+        symbols = detect_symbols(pic, xx, yy, board, previous=previous, scores=scores)
+        for y in range(0, 5):
+            for x in range(0, 5):
+                if (x, y) == (1, 2):
+                    self.assertEqual(symbols[y][x], 'X')
+                    self.assertTrue(scores[y][x] > CHANGE_THRESHOLD)
+                elif (x, y) == (3, 3):
+                    self.assertEqual(symbols[y][x], 'O')
+                    self.assertIsNone(scores[y][x])
+                else:
+                    self.assertEqual(symbols[y][x], '.')
+                    self.assertTrue(scores[y][x] <= CHANGE_THRESHOLD)
+        # Nothing changed, so all cells are classified
+        symbols = detect_symbols(pic, xx, yy, board, previous=pic.copy())
+        self.assertEqual(symbols, detect_symbols(pic, xx, yy, board))
+
+    def test_detect_symbols_keeps_pic(self):
+        # The picture is kept as previous for the next turn, so nothing may be drawn on it
+        pic = make_grid_pic(GRID_IMAGES)
+        original = pic.copy()
+        board = [ [ '.' ]*5 for y in range(0, 5) ]
+        detect_symbols(pic, (0, pic.shape[1]), (0, pic.shape[0]), board)
+        self.assertTrue((pic == original).all())
+
+    def test_detect_symbol_in_unchanged_cell(self):
+        images = [ [ None ]*5 for y in range(0, 5) ]
+        images[2][1] = GRID_IMAGES[2][1]
+        previous = make_grid_pic(images)
+        xx = (0, previous.shape[1])
+        yy = (0, previous.shape[0])
+        board = [ [ '.' ]*5 for y in range(0, 5) ]
+        # A shadow over empty cell (3, 3), the new symbol at (1, 2) does
+        # not differ from the previous picture
+        pic = previous.copy()
+        pic[340:430, 340:430] = 150
+        scores = []
+        symbols = detect_symbols(pic, xx, yy, board, previous=previous, scores=scores)
+        self.assertTrue(scores[3][3] > CHANGE_THRESHOLD)
+        self.assertTrue(scores[2][1] <= CHANGE_THRESHOLD)
+        self.assertEqual(symbols[2][1], 'X')
+        self.assertEqual(symbols[3][3], '.')
+        self.assertEqual(sum([ row.count('.') for row in symbols ]), 24)
+
+    def test_crossings(self):
+        lines = numpy.array([ [ 0, 100, 200, 100 ],    # H, crosses (100, 60)-(100, 300) 40 from its end
+                              [ 100, 60, 100, 300 ],   # V
+                              [ 0, 200, 200, 210 ],    # H, crosses both slanted lines
+                              [ 40, 0, 41, 400 ],      # V
+                              [ 160, 0, 159, 400 ],    # V
+                              [ 200, 100, 400, 100 ],  # H, touches first line only at end point
+                              [ 100, 320, 100, 500 ],  # V, touches nothing
+                              [ 0, 0, 200, 200 ] ],    # neither
+                            dtype=numpy.int32).reshape(-1, 1, 4)
+        (horizontal, vertical) = classify_segments(lines, 150, 70)
+        self.assertEqual(len(horizontal), 3)
+        self.assertEqual(len(vertical), 4)
+        (h, v) = find_crossings(horizontal, vertical, 40)
+        self.assertEqual(segment_tuples(horizontal[h]), set([ ((0.0, 100.0), (200.0, 100.0)),
+                                                               ((0.0, 200.0), (200.0, 210.0)) ]))
+        self.assertEqual(segment_tuples(vertical[v]), set([ ((100.0, 60.0), (100.0, 300.0)),
+                                                             ((40.0, 0.0), (41.0, 400.0)),
+                                                             ((160.0, 0.0), (159.0, 400.0)) ]))
+        # Now only the second H line and the first V line extend far enough
+        (h, v) = find_crossings(horizontal, vertical, 41)
+        self.assertEqual(segment_tuples(horizontal[h]), set([ ((0.0, 200.0), (200.0, 210.0)) ]))
+        self.assertEqual(segment_tuples(vertical[v]), set([ ((100.0, 60.0), (100.0, 300.0)) ]))
+
+    def test_learned_backend(self):
+        global BACKEND
+        pic = make_grid_pic(GRID_IMAGES)
+        xx = (0, pic.shape[1])
+        yy = (0, pic.shape[0])
+        board = [ [ '.' ]*5 for y in range(0, 5) ]
+        expected = detect_symbols(pic.copy(), xx, yy, board)
+        try:
+            BACKEND = 'learned'
+            self.assertEqual(detect_symbols(pic.copy(), xx, yy, board), expected)
+        finally:
+            BACKEND = 'heuristic'
+
+    def test_background_colour(self):
+        rng = numpy.random.default_rng(1)
+        for i in range(0, 50):
+            # Few colours, so there are ties
+            img = rng.integers(0, 3, (20, 30, 3), dtype=numpy.uint8)*120
+            colors, count = numpy.unique(img.reshape(-1, 3), axis=0, return_counts=True)
+            self.assertEqual(background_colour(img), tuple([ int(c) for c in colors[count.argmax()] ]))
+        img = cv2.imread('problems/o-outside-grid/out.png')
+        for step in [ 2, 4, 8 ]:
+            self.assertLessEqual(numpy.abs(numpy.subtract(background_colour(img, step), background_colour(img))).max(), 4)
+
 if __name__ == "__main__":
     unittest.main()
     if False:
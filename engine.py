@@ -0,0 +1,688 @@
+import atexit
+import multiprocessing
+import random
+import time
+import unittest
+from minimax import Game, ORDERINGS
+
+# Game engine for larger boards.
+#
+# Like Game, but with a width x height playing field, win length and border
+# width as parameters. The board is stored as bitmasks (see bitboard.py),
+# bit y*W + x for board coordinates (x, y), W being width plus two borders.
+# Moves use Game's coordinates: (0, 0) is the upper left square of the
+# playing field, the border has negative coordinates or ones >= width/height.
+#
+# Full search is far too slow on anything but 3 x 3, so the search uses
+# iterative deepening with a time budget and a heuristic evaluation at the
+# depth limit. Unlike Game, every line of win squares counts, including
+# the short diagonals in the corners of the border.
+#
+# With processes > 1 the moves at the root are searched in parallel by a
+# pool of processes (see search_root_parallel()). The pool is started on
+# the first search and kept for the next ones, until close().
+
+WIN = 1000000
+INFINITY = 10*WIN
+# Default time per move, in seconds
+TIME_BUDGET = 2.0
+
+class Timeout(Exception):
+    pass
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+# State of a worker process in the pool used by search_root_parallel()
+worker_engine = None
+worker_alpha = None
+
+def init_worker(engine, alpha):
+    global worker_engine, worker_alpha
+    worker_engine = engine
+    worker_alpha = alpha
+
+def search_worker(args):
+    """
+    Search one root move in a worker process.
+    Returns (index, score, nodes), score is None on timeout.
+    """
+    (index, me, them, depth, b, deadline, search, ordering) = args
+    e = worker_engine
+    e.nodes = 0
+    if deadline and time.monotonic() > deadline:
+        # Left over from a search that has timed out
+        return (index, None, 0)
+    if e.searches != search:
+        # The worker outlives a search, start each one afresh like search()
+        e.searches = search
+        e.ordering = ordering
+        e.killers = []
+        e.history = {}
+    e.deadline = deadline
+    alpha = worker_alpha.value
+    try:
+        # Search with alpha - 1, so that a move as good as the best one so
+        # far gets its exact score and ties are resolved as in search_root()
+        score = e.search_move(me, them, depth, b, alpha - 1)
+    except Timeout:
+        return (index, None, e.nodes)
+    with worker_alpha.get_lock():
+        if score > worker_alpha.value:
+            worker_alpha.value = score
+    return (index, score, e.nodes)
+
+class Engine:
+    def __init__(self, width=3, height=3, win=3, border=1, processes=1, ordering='static'):
+        """
+        processes is the number of processes to search with, None for one per CPU.
+        ordering is the move ordering, as for Game.set_move_ordering().
+        """
+        self.width = width
+        self.height = height
+        self.win = win
+        self.border = border
+        self.board_width = width + 2*border
+        self.board_height = height + 2*border
+        self.inner = 0
+        for y in range(0, height):
+            for x in range(0, width):
+                self.inner = self.inner | self.bit(x, y)
+        self.make_lines()
+        self.make_moves()
+        self.make_cheat_squares()
+        # Score for n symbols in a line with no enemy symbols
+        self.weights = [ 0 ] + [ 4**n for n in range(1, win) ]
+        self.processes = processes
+        if ordering not in ORDERINGS:
+            raise Exception('Unknown move ordering: %s' % ordering)
+        self.ordering = ordering
+        self.killers = []
+        self.history = {}
+        self.nodes = 0
+        self.deadline = None
+        self.searches = 0
+        self.pool = None
+        self.shared_alpha = None
+        self.initialize_game()
+
+    def __getstate__(self):
+        # Workers get a copy of the engine, without the pool
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['shared_alpha'] = None
+        return state
+
+    def get_pool(self):
+        """
+        Return the pool of processes, starting it on first use
+        """
+        if self.pool is None:
+            self.shared_alpha = multiprocessing.Value('q', -INFINITY)
+            self.pool = multiprocessing.Pool(self.processes, init_worker, (self, self.shared_alpha))
+            atexit.register(self.close)
+        return self.pool
+
+    def close(self):
+        """
+        Stop the pool of processes, if started
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.shared_alpha = None
+            atexit.unregister(self.close)
+
+    def initialize_game(self):
+        self.x_mask = 0
+        self.o_mask = 0
+
+    def bit(self, x, y):
+        """
+        Return bit for the square at (x, y) in move coordinates
+        """
+        return 1 << ((y + self.border)*self.board_width + x + self.border)
+
+    def make_lines(self):
+        """
+        Build self.lines, a list of (mask, c1, c2) for every line of
+        self.win squares, and the indexes of lines through each square
+        """
+        self.lines = []
+        lo_x = -self.border
+        lo_y = -self.border
+        hi_x = self.width + self.border
+        hi_y = self.height + self.border
+        for (dx, dy) in [ (0, 1), (1, 0), (1, 1), (-1, 1) ]:
+            for y in range(lo_y, hi_y):
+                for x in range(lo_x, hi_x):
+                    ex = x + (self.win - 1)*dx
+                    ey = y + (self.win - 1)*dy
+                    if ex < lo_x or ex >= hi_x or ey >= hi_y:
+                        continue
+                    mask = 0
+                    for i in range(0, self.win):
+                        mask = mask | self.bit(x + i*dx, y + i*dy)
+                    self.lines.append((mask, (x, y), (ex, ey)))
+        # Only lines inside the playing field can be completed without cheating
+        self.inner_lines = [ l[0] for l in self.lines if l[0] & self.inner == l[0] ]
+        self.lines_through = {}
+        self.inner_lines_through = {}
+        for y in range(lo_y, hi_y):
+            for x in range(lo_x, hi_x):
+                b = self.bit(x, y)
+                self.lines_through[b] = [ l for l in self.lines if l[0] & b ]
+                self.inner_lines_through[b] = [ m for m in self.inner_lines if m & b ]
+
+    def make_moves(self):
+        """
+        Build self.moves, the squares of the playing field as (x, y, bit),
+        centre first, and self.row_moves, the same row by row
+        """
+        cx = (self.width - 1)/2
+        cy = (self.height - 1)/2
+        squares = [ (x, y) for y in range(0, self.height) for x in range(0, self.width) ]
+        squares.sort(key=lambda s: (abs(s[0] - cx) + abs(s[1] - cy), s[1], s[0]))
+        self.moves = [ (x, y, self.bit(x, y)) for (x, y) in squares ]
+        self.row_moves = sorted(self.moves, key=lambda m: (m[1], m[0]))
+
+    def make_cheat_squares(self):
+        """
+        Build self.cheat_squares, the border squares as (priority, x, y, bit)
+        in the order Game.get_cheating_move() tries them
+        """
+        b = self.border
+        squares = []
+        for y in range(-b, 0):
+            squares += [ (10, x, y) for x in range(-b, self.width + b) ]
+        for y in range(self.height, self.height + b):
+            squares += [ (9, x, y) for x in range(-b, self.width + b) ]
+        for x in range(-b, 0):
+            squares += [ (8, x, y) for y in range(0, self.height) ]
+        for x in range(self.width, self.width + b):
+            squares += [ (7, x, y) for y in range(0, self.height) ]
+        self.cheat_squares = [ (p, x, y, self.bit(x, y)) for (p, x, y) in squares ]
+
+    def set_human(self, symbol):
+        self.human_symbol = symbol
+        self.computer_symbol = self.get_enemy(self.human_symbol)
+
+    def get_enemy(self, symbol):
+        if symbol == 'X':
+            return 'O'
+        if symbol == 'O':
+            return 'X'
+        return None
+
+    def get_mask(self, symbol):
+        if symbol == 'X':
+            return self.x_mask
+        if symbol == 'O':
+            return self.o_mask
+        return 0
+
+    def get_board(self):
+        board = []
+        for y in range(-self.border, self.height + self.border):
+            row = []
+            for x in range(-self.border, self.width + self.border):
+                b = self.bit(x, y)
+                if self.x_mask & b:
+                    row.append('X')
+                elif self.o_mask & b:
+                    row.append('O')
+                elif self.inner & b:
+                    row.append('.')
+                else:
+                    row.append(' ')
+            board.append(row)
+        return board
+
+    def show(self, board = None):
+        if not board:
+            board = self.get_board()
+        for row in board:
+            for c in row:
+                print('{}|'.format(c), end=" ")
+            print()
+        print()
+
+    def is_valid(self, px, py, force=False):
+        b = self.border if force else 0
+        if px < -b or px >= self.width + b or py < -b or py >= self.height + b:
+            return False
+        return not (self.x_mask | self.o_mask) & self.bit(px, py)
+
+    def make_move(self, x, y, symbol, force=False):
+        if x is None or y is None:
+            self.show()
+            raise Exception('Illegal move: x %s y %s' % (str(x), str(y)))
+        if not self.is_valid(x, y, force):
+            raise Exception('Illegal move at (%d, %d)' % (x, y))
+        if symbol == 'X':
+            self.x_mask = self.x_mask | self.bit(x, y)
+        else:
+            self.o_mask = self.o_mask | self.bit(x, y)
+
+    def erase_move(self, x, y):
+        b = self.bit(x, y)
+        self.x_mask = self.x_mask & ~b
+        self.o_mask = self.o_mask & ~b
+
+    def make_human_move(self, x, y):
+        self.make_move(x, y, self.human_symbol)
+
+    def make_computer_move(self, x, y, force=False):
+        self.make_move(x, y, self.computer_symbol, force)
+
+    def moves_left(self):
+        return popcount(self.inner & ~(self.x_mask | self.o_mask))
+
+    def game_over(self):
+        """
+        Return (winner, coord1, coord2), ('.', None, None) for a tie, or None
+        """
+        for (mask, c1, c2) in self.lines:
+            if self.x_mask & mask == mask:
+                return ('X', c1, c2)
+            if self.o_mask & mask == mask:
+                return ('O', c1, c2)
+        if (self.x_mask | self.o_mask) & self.inner == self.inner:
+            return ('.', None, None)
+        return None
+
+    def game_won(self):
+        go = self.game_over()
+        return go is not None and go[0] != '.'
+
+    def evaluate(self, me, them):
+        """
+        Return heuristic value of the position for the owner of me
+        """
+        score = 0
+        weights = self.weights
+        for mask in self.inner_lines:
+            if mask & them:
+                if not mask & me:
+                    score = score - weights[popcount(mask & them)]
+            elif mask & me:
+                score = score + weights[popcount(mask & me)]
+        return score
+
+    def wins(self, mask, b):
+        """
+        Return True if mask has a complete line through bit b
+        """
+        for line in self.inner_lines_through[b]:
+            if mask & line == line:
+                return True
+        return False
+
+    def negamax(self, me, them, depth, alpha, beta, ply):
+        self.nodes = self.nodes + 1
+        if self.deadline and self.nodes & 1023 == 0 and time.monotonic() > self.deadline:
+            raise Timeout()
+        occupied = me | them
+        if occupied & self.inner == self.inner:
+            return 0
+        if depth == 0:
+            return self.evaluate(me, them)
+        best = -INFINITY
+        moves = self.moves if self.ordering == 'static' else self.ordered_moves(me, them, ply)
+        for (x, y, b) in moves:
+            if occupied & b:
+                continue
+            if self.wins(me | b, b):
+                score = WIN - ply - 1
+            else:
+                score = -self.negamax(them, me | b, depth - 1, -beta, -alpha, ply + 1)
+            if score > best:
+                best = score
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        if self.ordering == 'killer' or self.ordering == 'history':
+                            self.record_cutoff((x, y, b), depth, ply)
+                        break
+        return best
+
+    def ordered_moves(self, me, them, ply):
+        """
+        Return moves as (x, y, bit) in the order given by self.ordering
+        (see Game.set_move_ordering()); occupied squares may be included
+        """
+        if self.ordering == 'row':
+            return self.row_moves
+        if self.ordering == 'tactical':
+            occupied = me | them
+            moves = [ m for m in self.moves if not occupied & m[2] ]
+            wins = [ m for m in moves if self.wins(me | m[2], m[2]) ]
+            blocks = [ m for m in moves if m not in wins and self.wins(them | m[2], m[2]) ]
+            return wins + blocks + [ m for m in moves if m not in wins and m not in blocks ]
+        if self.ordering == 'killer':
+            if ply >= len(self.killers):
+                return self.moves
+            killers = self.killers[ply]
+            return killers + [ m for m in self.moves if m not in killers ]
+        return sorted(self.moves, key=lambda m: -self.history.get(m[2], 0))
+
+    def record_cutoff(self, move, depth, ply):
+        """
+        Remember that move caused a cutoff, for 'killer' and 'history'
+        """
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[move[2]] = self.history.get(move[2], 0) + depth*depth
+
+    def search_move(self, me, them, depth, b, alpha):
+        """
+        Return score of the root move b, exact if greater than alpha
+        """
+        if self.wins(me | b, b):
+            return WIN - 1
+        return -self.negamax(them, me | b, depth - 1, -INFINITY, -alpha, 1)
+
+    def search_root(self, me, them, depth, moves):
+        """
+        Search moves (list of (x, y, bit)) to depth.
+        Returns (score, move) for the first best move.
+        """
+        alpha = -INFINITY
+        best = None
+        for move in moves:
+            score = self.search_move(me, them, depth, move[2], alpha)
+            if best is None or score > alpha:
+                alpha = score
+                best = move
+        return (alpha, best)
+
+    def search_root_parallel(self, me, them, depth, moves, pool, shared_alpha):
+        """
+        Like search_root(), but search all moves except the first in pool.
+        The first move is searched here before the others are started
+        ("young brothers wait"), so the workers start with a good alpha,
+        which they share through shared_alpha. Returns the same as search_root().
+        """
+        alpha = self.search_move(me, them, depth, moves[0][2], -INFINITY)
+        if len(moves) == 1 or alpha >= WIN - 1:
+            return (alpha, moves[0])
+        shared_alpha.value = alpha
+        scores = [ alpha ] + [ None ]*(len(moves) - 1)
+        jobs = [ (i, me, them, depth, moves[i][2], self.deadline, self.searches, self.ordering)
+                 for i in range(1, len(moves)) ]
+        timeout = False
+        # Wait for all jobs even after a timeout, the rest stop quickly once
+        # past the deadline and must not change shared_alpha in the next search
+        for (i, score, nodes) in pool.imap_unordered(search_worker, jobs):
+            self.nodes = self.nodes + nodes
+            if score is None:
+                timeout = True
+            scores[i] = score
+        if timeout:
+            raise Timeout()
+        # Every move as good as the best one has its exact score, so the
+        # first of them is the move search_root() would have found
+        best = max(scores)
+        return (best, moves[scores.index(best)])
+
+    def search(self, symbol, time_budget=TIME_BUDGET, max_depth=None):
+        """
+        Find best move for symbol, deepening the search until time_budget
+        seconds have passed (None for no limit) or max_depth is reached.
+        Returns (score, x, y, depth); depth is that of the last completed search.
+        """
+        me = self.get_mask(symbol)
+        them = self.get_mask(self.get_enemy(symbol))
+        occupied = me | them
+        moves = [ m for m in self.moves if not occupied & m[2] ]
+        if not moves:
+            return (0, None, None, 0)
+        self.nodes = 0
+        self.killers = []
+        self.history = {}
+        self.searches = self.searches + 1
+        self.deadline = None if time_budget is None else time.monotonic() + time_budget
+        limit = len(moves) if max_depth is None else min(max_depth, len(moves))
+        result = (0, moves[0], 0)
+        pool = None
+        if self.processes != 1 and len(moves) > 1:
+            pool = self.get_pool()
+            self.shared_alpha.value = -INFINITY
+        try:
+            for depth in range(1, limit + 1):
+                if pool:
+                    (score, move) = self.search_root_parallel(me, them, depth, moves, pool, self.shared_alpha)
+                else:
+                    (score, move) = self.search_root(me, them, depth, moves)
+                result = (score, move, depth)
+                if abs(score) > WIN - 1000:
+                    # Forced win or loss found, deeper search will not change it
+                    break
+                # Try the best move first in the next iteration
+                moves.remove(move)
+                moves.insert(0, move)
+        except Timeout:
+            pass
+        finally:
+            self.deadline = None
+        (score, move, depth) = result
+        return (score, move[0], move[1], depth)
+
+    def get_human_move(self, time_budget=TIME_BUDGET):
+        """
+        Return (m, x, y) for the human
+        """
+        (m, x, y, depth) = self.search(self.human_symbol, time_budget)
+        return (m, x, y)
+
+    def threats(self, symbol):
+        """
+        Return list of (x, y) in the playing field where symbol completes a line
+        """
+        mine = self.get_mask(symbol)
+        occupied = self.x_mask | self.o_mask
+        result = []
+        for (x, y, b) in self.moves:
+            if not occupied & b and self.wins(mine | b, b):
+                result.append((x, y))
+        return result
+
+    def get_computer_move(self, allow_early_cheat=False, time_budget=TIME_BUDGET):
+        """
+        Return (m, x, y, cheating)
+        """
+        (m, x, y, depth) = self.search(self.computer_symbol, time_budget)
+        if allow_early_cheat and self.moves_left() <= 3:
+            if m > WIN - 1000:
+                # We will win without cheating
+                return (m, x, y, False)
+            cheat = self.get_cheating_move()
+            if cheat:
+                print('Cheating')
+                return (cheat[0], cheat[1], cheat[2], True)
+        # Can the human win in next move?
+        self.make_computer_move(x, y)
+        try:
+            if not self.game_won() and self.threats(self.human_symbol):
+                print('Looking bad - human can win at %s' % self.threats(self.human_symbol))
+                cheat = self.get_cheating_move()
+                if cheat:
+                    print('Cheating')
+                    return (cheat[0], cheat[1], cheat[2], True)
+        finally:
+            self.erase_move(x, y)
+        return (m, x, y, False)
+
+    def get_cheating_moves(self):
+        """
+        Return list of (priority, x, y) for every border square where the
+        computer wins by cheating, best first
+        """
+        computer = self.get_mask(self.computer_symbol)
+        occupied = self.x_mask | self.o_mask
+        moves = []
+        for (prio, x, y, b) in self.cheat_squares:
+            if occupied & b:
+                continue
+            for (mask, c1, c2) in self.lines_through[b]:
+                if (computer | b) & mask == mask:
+                    moves.append((prio, x, y))
+                    break
+        return moves
+
+    def get_cheating_move(self):
+        moves = self.get_cheating_moves()
+        if moves:
+            return moves[0]
+        return None
+
+class TestEngineMethods(unittest.TestCase):
+
+    def test_lines(self):
+        e = Engine()
+        # 5 x 5 board: 15 vertical, 15 horizontal, 9 + 9 diagonal
+        self.assertEqual(len(e.lines), 48)
+        self.assertEqual(len(e.inner_lines), 8)
+        e = Engine(5, 4, 4, 1)
+        for (mask, c1, c2) in e.lines:
+            self.assertEqual(popcount(mask), 4)
+            self.assertTrue(mask & e.bit(c1[0], c1[1]))
+            self.assertTrue(mask & e.bit(c2[0], c2[1]))
+
+    def test_game_over(self):
+        e = Engine(5, 5, 4, 1)
+        e.set_human('O')
+        for x in range(1, 5):
+            e.make_human_move(x, 2)
+        self.assertEqual(e.game_over(), ('O', (1, 2), (4, 2)))
+        e = Engine(5, 5, 4, 1)
+        e.set_human('O')
+        for i in range(0, 4):
+            e.make_computer_move(3 - i, i - 1, force=True)
+        self.assertEqual(e.game_over(), ('X', (3, -1), (0, 2)))
+
+    def test_same_values_as_game(self):
+        # Full depth search on 3 x 3 must agree with Game on who wins
+        rng = random.Random(1)
+        for i in range(0, 50):
+            g = Game()
+            g.set_human('O')
+            e = Engine()
+            e.set_human('O')
+            cells = [ (x, y) for y in range(0, 3) for x in range(0, 3) ]
+            rng.shuffle(cells)
+            for n in range(0, rng.randint(1, 5)):
+                (x, y) = cells[n]
+                g.make_move(x, y, 'O' if n % 2 == 0 else 'X')
+                e.make_move(x, y, 'O' if n % 2 == 0 else 'X')
+            if g.game_over():
+                continue
+            (m, x, y) = g.max_alpha_beta(-2, 2)
+            (score, ex, ey, depth) = e.search('X', time_budget=None)
+            self.assertEqual((score > 0) - (score < 0), m)
+
+    def test_find_best_move(self):
+        e = Engine()
+        e.set_human('O')
+        e.make_human_move(1, 1)
+        (m, px, py, cheating) = e.get_computer_move()
+        e.make_computer_move(px, py)
+        e.make_human_move(0, 1)
+        (m, px, py, cheating) = e.get_computer_move()
+        # Computer must play (2, 1) to prevent human win
+        self.assertEqual((px, py), (2, 1))
+
+    def test_time_budget(self):
+        e = Engine(5, 5, 4, 1)
+        e.set_human('O')
+        e.make_human_move(2, 2)
+        start = time.monotonic()
+        (m, x, y, depth) = e.search('X', time_budget=0.2)
+        self.assertTrue(time.monotonic() - start < 0.5)
+        self.assertTrue(e.is_valid(x, y))
+        self.assertTrue(depth >= 1)
+
+    def test_parallel(self):
+        # Parallel search must find the same move as sequential search
+        for (w, h, k, depth) in [ (3, 3, 3, 9), (4, 4, 3, 4), (5, 5, 4, 3) ]:
+            for moves in [ [], [ (1, 1) ], [ (0, 0), (1, 0) ] ]:
+                results = []
+                for processes in [ 1, 2 ]:
+                    e = Engine(w, h, k, 1, processes)
+                    e.set_human('O')
+                    for (n, (x, y)) in enumerate(moves):
+                        e.make_move(x, y, 'O' if n % 2 == 0 else 'X')
+                    symbol = 'O' if len(moves) % 2 == 0 else 'X'
+                    results.append(e.search(symbol, time_budget=None, max_depth=depth))
+                    e.close()
+                self.assertEqual(results[0], results[1])
+
+    def test_orderings(self):
+        # All move orderings must give the same score
+        for (w, h, k, depth) in [ (3, 3, 3, 9), (4, 4, 3, 4), (5, 5, 4, 3) ]:
+            for moves in [ [], [ (1, 1) ], [ (0, 0), (1, 0) ] ]:
+                scores = []
+                for ordering in ORDERINGS:
+                    e = Engine(w, h, k, 1, ordering=ordering)
+                    e.set_human('O')
+                    for (n, (x, y)) in enumerate(moves):
+                        e.make_move(x, y, 'O' if n % 2 == 0 else 'X')
+                    symbol = 'O' if len(moves) % 2 == 0 else 'X'
+                    (score, x, y, d) = e.search(symbol, time_budget=None, max_depth=depth)
+                    self.assertTrue(e.is_valid(x, y))
+                    scores.append(score)
+                self.assertEqual(len(set(scores)), 1)
+        with self.assertRaises(Exception):
+            Engine(ordering='random')
+
+    def test_parallel_time_budget(self):
+        e = Engine(5, 5, 4, 1, processes=2)
+        e.set_human('O')
+        e.make_human_move(2, 2)
+        start = time.monotonic()
+        (m, x, y, depth) = e.search('X', time_budget=0.5)
+        self.assertTrue(time.monotonic() - start < 1.5)
+        self.assertTrue(e.is_valid(x, y))
+        e.close()
+
+    def test_parallel_reuse(self):
+        # The pool is kept between searches and gives the same moves as a
+        # sequential search, also after a search has timed out
+        e = Engine(4, 4, 3, 1, processes=2, ordering='killer')
+        s = Engine(4, 4, 3, 1, ordering='killer')
+        self.assertIsNone(e.pool)
+        e.search('X', time_budget=0.01)
+        pool = e.get_pool()
+        for (symbol, x, y) in [ ('O', 1, 1), ('X', 2, 2), ('O', 0, 0) ]:
+            for engine in [ e, s ]:
+                engine.make_move(x, y, symbol)
+            self.assertEqual(e.search('X', time_budget=None, max_depth=4),
+                             s.search('X', time_budget=None, max_depth=4))
+            self.assertIs(e.pool, pool)
+        e.close()
+        self.assertIsNone(e.pool)
+        e.close()
+
+    def test_cheat(self):
+        e = Engine(4, 4, 3, 1)
+        e.set_human('X')
+        e.make_computer_move(0, 0)
+        e.make_computer_move(0, 1)
+        self.assertEqual(e.get_cheating_moves(), [ (10, 0, -1) ])
+
+if __name__ == "__main__":
+    for (w, h, k) in [ (3, 3, 3), (4, 4, 3), (5, 5, 4), (7, 6, 4) ]:
+        for processes in [ 1, None ]:
+            e = Engine(w, h, k, 1, processes)
+            e.set_human('O')
+            start = time.monotonic()
+            (m, x, y, depth) = e.search('X')
+            print('%d x %d, %d in a row, %s processes: (%d, %d) score %d depth %d, %d nodes in %.2f s' %
+                  (w, h, k, processes or multiprocessing.cpu_count(), x, y, m, depth, e.nodes,
+                   time.monotonic() - start))
+    unittest.main()
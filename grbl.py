@@ -4,6 +4,9 @@ import math
 import time
 from enum import Enum
 from random import randint
+import xolog
+
+log = xolog.get_logger(__name__)
 
 class Symbol(Enum):
     CROSS = 1
@@ -27,20 +30,20 @@ class Grbl:
         self.grid_size = grid_size
         self.symbol = Symbol.CROSS
         self.is_pen_up = None
-        print("Opening serial port")
+        log.info("Opening serial port")
         self.ser = serial.Serial(port = serial_port,
             baudrate = 115200,
             timeout = 1.0)
-        print("Opened serial port")
+        log.info("Opened serial port")
         time.sleep(2)
         self.ser.flushInput()
         self.write(b"$X\n")
         self.pen_up(True)
         if home:
-            print("Homing")
+            log.info("Homing")
             self.write(b"$H\n")
         else:
-            print("WARNING: Unlocked")
+            log.warning("Unlocked")
         time.sleep(0.5)
         self.wait_for_ok()
 
@@ -109,7 +112,7 @@ class Grbl:
         time.sleep(1)
 
     def draw_line(self, x1, y1, x2, y2, speed=None):
-        print("line %d, %d ->  %d, %d" % (x1, y1, x2, y2))
+        log.debug("line %d, %d ->  %d, %d", x1, y1, x2, y2)
         move_speed = self.max_speed
         draw_speed = self.draw_speed
         if speed:
@@ -135,7 +138,7 @@ class Grbl:
         self.goto(self.origin_x + 3*self.grid_size, self.origin_y + 3*self.grid_size, speed=self.max_speed)
 
     def present(self):
-        print('origin %d, %d' % (self.origin_x, self.origin_y))
+        log.debug('origin %d, %d', self.origin_x, self.origin_y)
         x = self.origin_x + 5*self.grid_size
         if x > self.MAX_X:
             x = self.MAX_X - 1
@@ -191,7 +194,7 @@ class Grbl:
         self.pen_up(True)
 
     def show_winner(self, c1, c2):
-        print('show_winner(%s, %s)' % (str(c1), str(c2)))
+        log.info('show_winner(%s, %s)', c1, c2)
         x1 = self.origin_x + (2 - c1[0] + 0.5) * self.grid_size
         y1 = self.origin_y + (2 - c1[1] + 0.5) * self.grid_size
         x2 = self.origin_x + (2 - c2[0] + 0.5) * self.grid_size
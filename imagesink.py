@@ -0,0 +1,179 @@
+import atexit
+import collections
+import os
+import tempfile
+import threading
+import time
+import unittest
+import cv2
+import numpy
+import xolog
+
+# Write debug images from a background thread.
+#
+# cv2.imwrite() to the SD card takes tens of milliseconds, too long to do in
+# the middle of a turn. ImageSink.write() copies the image into a bounded
+# queue and returns; a thread encodes and writes it. If the queue is full
+# the oldest image is dropped, so diagnostics never hold up the game.
+
+# Number of images waiting to be written before the oldest is dropped
+QUEUE_SIZE = 8
+# 'png', 'npy' (raw numpy array, fastest) or 'off'
+ENCODING = 'png'
+# 0 (fast, large files) to 9 (slow, small files)
+PNG_COMPRESSION = 1
+# Write image if ENABLED[name] (name is the file name without directory and
+# extension, e.g. 'grid_pic'), images not listed are written
+ENABLED = {}
+
+log = xolog.get_logger(__name__)
+
+class ImageSink:
+    def __init__(self, size=QUEUE_SIZE, encoding=None, compression=None, enabled=None):
+        """
+        encoding, compression and enabled default to the module settings
+        """
+        self.encoding = encoding
+        self.compression = compression
+        self.enabled = enabled
+        self.queue = collections.deque(maxlen=size)
+        self.condition = threading.Condition()
+        self.busy = False
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.write_time = 0
+
+    def get_encoding(self):
+        return ENCODING if self.encoding is None else self.encoding
+
+    def get_compression(self):
+        return PNG_COMPRESSION if self.compression is None else self.compression
+
+    def is_enabled(self, path):
+        """
+        Return True if the image written to path should be saved
+        """
+        if self.get_encoding() == 'off':
+            return False
+        enabled = ENABLED if self.enabled is None else self.enabled
+        name = os.path.splitext(os.path.basename(path))[0]
+        return enabled.get(name, True)
+
+    def write(self, path, image):
+        """
+        Queue image to be written to path, the extension is replaced by .npy
+        for 'npy' encoding. Returns False if the image is not saved.
+        """
+        if not self.is_enabled(path):
+            return False
+        # The caller may change the image once we return
+        image = image.copy()
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped = self.dropped + 1
+            self.queue.append((path, image))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='imagesink', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+        return True
+
+    def save(self, path, image):
+        encoding = self.get_encoding()
+        if encoding == 'npy':
+            numpy.save(os.path.splitext(path)[0] + '.npy', image)
+        elif encoding == 'png':
+            cv2.imwrite(path, image, [ cv2.IMWRITE_PNG_COMPRESSION, self.get_compression() ])
+        elif encoding != 'off':
+            raise Exception('Unknown image encoding %s' % encoding)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.busy = False
+                    self.condition.notify_all()
+                    self.condition.wait()
+                (path, image) = self.queue.popleft()
+                self.busy = True
+            start = time.perf_counter()
+            try:
+                self.save(path, image)
+            except Exception as e:
+                log.error('Could not write %s: %s', path, e)
+            with self.condition:
+                self.written = self.written + 1
+                self.write_time = self.write_time + time.perf_counter() - start
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued images have been written.
+        Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.busy, timeout)
+
+    def __str__(self):
+        return '%d images written in %.1f ms, %d dropped' % (self.written, 1000*self.write_time, self.dropped)
+
+sink = ImageSink()
+atexit.register(sink.flush, 5)
+
+def imwrite(path, image):
+    """
+    Write image to path in the background, like cv2.imwrite()
+    """
+    return sink.write(path, image)
+
+class TestImageSink(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_write(self):
+        s = ImageSink()
+        img = numpy.full((20, 30, 3), 128, dtype=numpy.uint8)
+        self.assertTrue(s.write(self.path('a.png'), img))
+        # The queued image is a copy
+        img[:] = 0
+        self.assertTrue(s.flush(5))
+        self.assertEqual(s.written, 1)
+        self.assertTrue((cv2.imread(self.path('a.png')) == 128).all())
+
+    def test_npy(self):
+        s = ImageSink(encoding='npy')
+        img = numpy.arange(12, dtype=numpy.uint8).reshape(3, 4)
+        s.write(self.path('b.png'), img)
+        s.flush(5)
+        self.assertTrue((numpy.load(self.path('b.npy')) == img).all())
+
+    def test_disabled(self):
+        s = ImageSink(enabled={ 'c': False })
+        img = numpy.zeros((4, 4), dtype=numpy.uint8)
+        self.assertFalse(s.write(self.path('c.png'), img))
+        self.assertTrue(s.write(self.path('d.png'), img))
+        self.assertTrue(s.flush(5))
+        self.assertFalse(ImageSink(encoding='off').write(self.path('e.png'), img))
+        self.assertEqual(sorted(os.listdir(self.dir.name)), [ 'd.png' ])
+
+    def test_drop_oldest(self):
+        s = ImageSink(size=2)
+        # Holding the lock keeps the writer thread from taking images
+        with s.condition:
+            for i in range(0, 5):
+                s.write(self.path('%d.png' % i), numpy.full((4, 4), i, dtype=numpy.uint8))
+            self.assertEqual(len(s.queue), 2)
+        s.flush(5)
+        self.assertEqual(s.dropped, 3)
+        self.assertEqual(s.written, 2)
+        self.assertEqual(sorted(os.listdir(self.dir.name)), [ '3.png', '4.png' ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,116 @@
+import book
 import copy
+import os
+import random
+import tempfile
 import time
 import unittest
 
+def make_lines():
+    """
+    Return list of (cells, c1, c2) for every line of three on the 5 x 5 board.
+    cells are board coordinates (0-4), c1 and c2 are the end points in
+    move coordinates (-1-3) as used by show_winner() and verify_winner().
+    """
+    lines = []
+    def add(cells):
+        c1 = (cells[0][0] - 1, cells[0][1] - 1)
+        c2 = (cells[2][0] - 1, cells[2][1] - 1)
+        lines.append((tuple(cells), c1, c2))
+    # Vertical
+    for i in range(0, 5):
+        for j in range(0, 3):
+            add([ (i, j), (i, j+1), (i, j+2) ])
+    # Horizontal
+    for i in range(0, 5):
+        for j in range(0, 3):
+            add([ (j, i), (j+1, i), (j+2, i) ])
+    # Main diagonal: left, center, right
+    for j in range(0, 2):
+        add([ (j, j+1), (j+1, j+2), (j+2, j+3) ])
+    for j in range(0, 3):
+        add([ (j, j), (j+1, j+1), (j+2, j+2) ])
+    for j in range(0, 2):
+        add([ (j+1, j), (j+2, j+1), (j+3, j+2) ])
+    # Second diagonal: left, center, right
+    for j in range(0, 2):
+        add([ (3-j, j), (2-j, j+1), (1-j, j+2) ])
+    for j in range(0, 3):
+        add([ (4-j, j), (3-j, j+1), (2-j, j+2) ])
+    for j in range(0, 2):
+        add([ (4-j, j+1), (3-j, j+2), (2-j, j+3) ])
+    return lines
+
+# Every line, in the order game_over() checks them
+LINES = make_lines()
+
+# Lines through each cell (board coordinates), in the same order
+LINES_THROUGH = {}
+for y in range(0, 5):
+    for x in range(0, 5):
+        LINES_THROUGH[(x, y)] = [ l for l in LINES if (x, y) in l[0] ]
+
+# Border squares in the order they are tried when cheating, as
+# (priority, x, y, lines through the square)
+CHEAT_SQUARES = ([ (10, x, -1) for x in range(-1, 4) ] + # upper border
+                 [ (9, x, 3) for x in range(-1, 4) ] +   # lower border
+                 [ (8, -1, y) for y in range(0, 3) ] +   # left border
+                 [ (7, 3, y) for y in range(0, 3) ])     # right border
+CHEAT_SQUARES = [ (prio, x, y, LINES_THROUGH[(x+1, y+1)]) for (prio, x, y) in CHEAT_SQUARES ]
+
+# Move orderings for the search, see Game.set_move_ordering()
+ORDERINGS = [ 'row', 'static', 'tactical', 'killer', 'history' ]
+
+# Squares of the playing field as (x, y), row by row
+ROW_MAJOR = [ (x, y) for y in range(0, 3) for x in range(0, 3) ]
+# Centre first, then corners, then edges
+STATIC_ORDER = [ (1, 1), (0, 0), (2, 0), (0, 2), (2, 2), (1, 0), (0, 1), (2, 1), (1, 2) ]
+
+class SearchStats:
+    """
+    What the engine did during get_computer_move() or get_human_move().
+    Pass one as stats= to record into it. Counters add up over calls, so
+    use a new one for each turn.
+    """
+    def __init__(self):
+        # Positions searched and alpha/beta cutoffs
+        self.nodes = 0
+        self.cutoffs = 0
+        # Deepest search, in moves from the position searched
+        self.max_depth = 0
+        self.depth = 0
+        # Seconds spent checking for game over, and looking for cheating moves
+        self.game_over_time = 0
+        self.cheat_time = 0
+        # Moves taken from the move book
+        self.book_moves = 0
+        # Squares where the human could win right after the computer's
+        # move, as found by get_computer_move()
+        self.threats = []
+        self.time = 0
+
+    def enter(self):
+        self.depth = self.depth + 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def leave(self, cutoff=False):
+        self.depth = self.depth - 1
+        if cutoff:
+            self.cutoffs = self.cutoffs + 1
+
+    def __str__(self):
+        return ('%d nodes, %d cutoffs, depth %d, book %d, game_over %.3f ms, cheat scan %.3f ms, '
+                'threats %s, total %.3f ms' %
+                (self.nodes, self.cutoffs, self.max_depth, self.book_moves, 1000*self.game_over_time,
+                 1000*self.cheat_time, str(self.threats), 1000*self.time))
+
 class Game:
     def __init__(self):
+        self.tt = None
+        self.stats = None
+        self.set_move_ordering('row')
+        self.book = book.get_default()
         self.initialize_game()
 
     def initialize_game(self):
@@ -14,17 +121,44 @@ class Game:
                               [ ' ', ' ', ' ', ' ', ' ' ]]
 
     def copy(self, other):
-        self.current_state = copy.deepcopy(other.current_state)
+        self.current_state = copy.deepcopy(other.get_board())
         self.human_symbol = other.human_symbol
         self.computer_symbol = other.computer_symbol
+        self.tt = other.tt
+        self.book = other.book
+        self.set_move_ordering(other.ordering)
 
     def set_human(self, symbol):
         self.human_symbol = symbol
         self.computer_symbol = self.get_enemy(self.human_symbol)
 
+    def set_transposition_table(self, tt):
+        """
+        Use tt (a transposition.TranspositionTable) in the search, or None
+        """
+        self.tt = tt
+
+    def set_move_ordering(self, ordering):
+        """
+        Set the order the search tries moves in, one of ORDERINGS:
+        'row': row by row (default, the order the move book was made with)
+        'static': centre, then corners, then edges
+        'tactical': winning moves, then blocking moves, then as 'static'
+        'killer': the moves that last caused a cutoff at this depth, then as 'static'
+        'history': moves that have caused most cutoffs first, then as 'static'
+        All orderings give the same value, but may pick a different one of
+        several equally good moves.
+        """
+        if ordering not in ORDERINGS:
+            raise Exception('Unknown move ordering: %s' % ordering)
+        self.ordering = ordering
+        # Killer moves by number of empty squares, history by square
+        self.killers = {}
+        self.history = dict([ (move, 0) for move in STATIC_ORDER ])
+
     def show(self, board = None):
         if not board:
-            board = self.current_state
+            board = self.get_board()
         for i in range(0, 5):
             for j in range(0, 5):
                 print('{}|'.format(board[i][j]), end=" ")
@@ -47,63 +181,31 @@ class Game:
     # If yes, returns (winner, coord1, coord2)
     # Else returns None
     def game_over(self):
-        # Vertical win
-        for i in range(0, 5):
-            for j in range(0, 3):
-                if (self.is_occupied(i, j) and
-                    self.current_state[j][i] == self.current_state[j+1][i] and
-                    self.current_state[j][i] == self.current_state[j+2][i]):
-                    return (self.current_state[j][i], (i-1, j-1), (i-1, j+1))
+        state = self.current_state
+        for ((x1, y1), (x2, y2), (x3, y3)), c1, c2 in LINES:
+            sym = state[y1][x1]
+            if (sym != '.' and sym != ' ' and
+                sym == state[y2][x2] and sym == state[y3][x3]):
+                return (sym, c1, c2)
+        return self.board_full()
 
-        # Horizontal win
-        for i in range(0, 5):
-            for j in range(0, 3):
-                if (self.current_state[i][j:j+3] == ['X', 'X', 'X']):
-                    return ('X', (j-1, i-1), (j+1, i-1))
-                elif (self.current_state[i][j:j+3] == ['O', 'O', 'O']):
-                    return ('O', (j-1, i-1), (j+1, i-1))
-
-        # Main diagonal wins
-        # Left
-        for j in range(0, 2):
-            if (self.is_occupied(j, j+1) and
-                self.current_state[j+1][j] == self.current_state[j+2][j+1] and
-                self.current_state[j+1][j] == self.current_state[j+3][j+2]):
-                return (self.current_state[j+1][j], (j-1, j), (j+2, j+2))
-        # Center
-        for j in range(0, 3):
-            if (self.is_occupied(0+j, 0+j) and
-                self.current_state[0+j][0+j] == self.current_state[1+j][1+j] and
-                self.current_state[0+j][0+j] == self.current_state[2+j][2+j]):
-                return (self.current_state[0+j][0+j], (j-1, j-1), (j+1, j+1))
-        # Right
-        for j in range(0, 2):
-            if (self.is_occupied(j+1, j) and
-                self.current_state[j][j+1] == self.current_state[j+1][j+2] and
-                self.current_state[j][j+1] == self.current_state[j+2][j+3]):
-                return (self.current_state[j][j+1], (j, j-1), (j+1, j+2))
-
-        # Second diagonal wins
-        # Left
-        for j in range(0, 2):
-            if (self.is_occupied(3-j, j) and
-                self.current_state[j][3-j] == self.current_state[j+1][2-j] and
-                self.current_state[j][3-j] == self.current_state[j+2][1-j]):
-                return (self.current_state[j][3-j], (2-j, j-1), (0-j, j+1))
-        # Center
-        for j in range(0, 3):
-            if (self.is_occupied(4-j, j) and
-                self.current_state[j][4-j] == self.current_state[j+1][3-j] and
-                self.current_state[j][4-j] == self.current_state[j+2][2-j]):
-                return (self.current_state[j][4-j], (3-j, j-1), (1-j, j+1))
-        # Right
-        for j in range(0, 2):
-            if (self.is_occupied(4-j, j+1) and
-                self.current_state[j+1][4-j] == self.current_state[j+2][3-j] and
-                self.current_state[j+1][4-j] == self.current_state[j+3][2-j]):
-                return (self.current_state[j+1][4-j], (3-j, j), (1-j, j+2))
-
-        # Is whole board full?
+    def game_over_at(self, x, y):
+        """
+        Like game_over(), but only checks the lines through (x, y).
+        Only valid if the game was not over before the move at (x, y).
+        """
+        state = self.current_state
+        for ((x1, y1), (x2, y2), (x3, y3)), c1, c2 in LINES_THROUGH[(x+1, y+1)]:
+            sym = state[y1][x1]
+            if (sym != '.' and sym != ' ' and
+                sym == state[y2][x2] and sym == state[y3][x3]):
+                return (sym, c1, c2)
+        return self.board_full()
+
+    def board_full(self):
+        """
+        Return ('.', None, None) if the playing field is full, else None
+        """
         for i in range(0, 3):
             for j in range(0, 3):
                 # There's an empty field, we continue the game
@@ -157,16 +259,16 @@ class Game:
     def make_computer_move(self, x, y, force=False):
         self.make_move(x, y, self.computer_symbol, force)
 
-    def max_alpha_beta(self, alpha, beta):
+    def max_alpha_beta(self, alpha, beta, last=None):
         """
         Determine optimal move
+        last is the (x, y) of the move leading to this position, if known
         Returns (max_value, x, y)
         """
-        maxv = -2
-        px = None
-        py = None
-
-        result = self.game_over()
+        if self.stats is None:
+            result = self.game_over() if last is None else self.game_over_at(last[0], last[1])
+        else:
+            result = self.timed_game_over(last)
 
         if result:
             if result[0] == self.human_symbol:
@@ -176,34 +278,62 @@ class Game:
             elif result[0] == '.':
                 return (0, 0, 0)
 
-        for i in range(0, 3):
-            for j in range(0, 3):
-                if self.current_state[i+1][j+1] == '.':
-                    self.current_state[i+1][j+1] = self.computer_symbol
-                    (m, min_i, in_j) = self.min_alpha_beta(alpha, beta)
-                    if m > maxv:
-                        maxv = m
-                        py = i
-                        px = j
-                    self.current_state[i+1][j+1] = '.'
-
-                    # Next two ifs in Max and Min are the only difference between regular algorithm and minimax
-                    if maxv >= beta:
-                        return (maxv, px, py)
-
-                    if maxv > alpha:
-                        alpha = maxv
+        if self.tt is not None:
+            (slot, hit) = self.tt.probe(self.current_state, 'max' + self.computer_symbol, alpha, beta)
+            if hit:
+                return hit
+            return self.tt.store(slot, self.max_moves(alpha, beta), alpha, beta)
+        return self.max_moves(alpha, beta)
 
-        return (maxv, px, py)
+    def timed_game_over(self, last):
+        """
+        Return game_over() for a node in the search, counting it in self.stats
+        """
+        start = time.perf_counter()
+        result = self.game_over() if last is None else self.game_over_at(last[0], last[1])
+        self.stats.game_over_time = self.stats.game_over_time + time.perf_counter() - start
+        self.stats.nodes = self.stats.nodes + 1
+        return result
 
-    def min_alpha_beta(self, alpha, beta):
+    def max_moves(self, alpha, beta):
+        maxv = -2
+        px = None
+        py = None
+        stats = self.stats
+        if stats is not None:
+            stats.enter()
+        moves = ROW_MAJOR if self.ordering == 'row' else self.ordered_moves(self.computer_symbol)
 
-        minv = 2
+        for (j, i) in moves:
+            if self.current_state[i+1][j+1] == '.':
+                self.current_state[i+1][j+1] = self.computer_symbol
+                (m, min_i, in_j) = self.min_alpha_beta(alpha, beta, (j, i))
+                if m > maxv:
+                    maxv = m
+                    py = i
+                    px = j
+                self.current_state[i+1][j+1] = '.'
 
-        qx = None
-        qy = None
+                # Next two ifs in Max and Min are the only difference between regular algorithm and minimax
+                if maxv >= beta:
+                    if stats is not None:
+                        stats.leave(cutoff=True)
+                    if self.ordering == 'killer' or self.ordering == 'history':
+                        self.record_cutoff(j, i)
+                    return (maxv, px, py)
+
+                if maxv > alpha:
+                    alpha = maxv
 
-        result = self.game_over()
+        if stats is not None:
+            stats.leave()
+        return (maxv, px, py)
+
+    def min_alpha_beta(self, alpha, beta, last=None):
+        if self.stats is None:
+            result = self.game_over() if last is None else self.game_over_at(last[0], last[1])
+        else:
+            result = self.timed_game_over(last)
 
         if result:
             if result[0] == self.human_symbol:
@@ -213,25 +343,101 @@ class Game:
             elif result[0] == '.':
                 return (0, 0, 0)
 
-        for i in range(0, 3):
-            for j in range(0, 3):
-                if self.current_state[i+1][j+1] == '.':
-                    self.current_state[i+1][j+1] = self.human_symbol
-                    (m, max_i, max_j) = self.max_alpha_beta(alpha, beta)
-                    if m < minv:
-                        minv = m
-                        qy = i
-                        qx = j
-                    self.current_state[i+1][j+1] = '.'
+        if self.tt is not None:
+            (slot, hit) = self.tt.probe(self.current_state, 'min' + self.computer_symbol, alpha, beta)
+            if hit:
+                return hit
+            return self.tt.store(slot, self.min_moves(alpha, beta), alpha, beta)
+        return self.min_moves(alpha, beta)
 
-                    if minv <= alpha:
-                        return (minv, qx, qy)
+    def min_moves(self, alpha, beta):
+        minv = 2
+
+        qx = None
+        qy = None
+        stats = self.stats
+        if stats is not None:
+            stats.enter()
+        moves = ROW_MAJOR if self.ordering == 'row' else self.ordered_moves(self.human_symbol)
 
-                    if minv < beta:
-                        beta = minv
+        for (j, i) in moves:
+            if self.current_state[i+1][j+1] == '.':
+                self.current_state[i+1][j+1] = self.human_symbol
+                (m, max_i, max_j) = self.max_alpha_beta(alpha, beta, (j, i))
+                if m < minv:
+                    minv = m
+                    qy = i
+                    qx = j
+                self.current_state[i+1][j+1] = '.'
 
+                if minv <= alpha:
+                    if stats is not None:
+                        stats.leave(cutoff=True)
+                    if self.ordering == 'killer' or self.ordering == 'history':
+                        self.record_cutoff(j, i)
+                    return (minv, qx, qy)
+
+                if minv < beta:
+                    beta = minv
+
+        if stats is not None:
+            stats.leave()
         return (minv, qx, qy)
 
+    def completes_line(self, x, y, symbol):
+        """
+        Return True if symbol at the empty square (x, y) would complete a line
+        """
+        for (cells, c1, c2) in LINES_THROUGH[(x+1, y+1)]:
+            n = 0
+            for (cx, cy) in cells:
+                if self.current_state[cy][cx] == symbol:
+                    n = n + 1
+            if n == 2:
+                return True
+        return False
+
+    def threats(self, symbol):
+        """
+        Return list of (x, y) in the playing field where symbol would
+        complete a line in one move
+        """
+        result = []
+        for (x, y) in ROW_MAJOR:
+            if self.current_state[y+1][x+1] == '.' and self.completes_line(x, y, symbol):
+                result.append((x, y))
+        return result
+
+    def ordered_moves(self, symbol):
+        """
+        Return empty squares as (x, y), in the order given by self.ordering,
+        for symbol to move
+        """
+        moves = [ move for move in STATIC_ORDER if self.current_state[move[1]+1][move[0]+1] == '.' ]
+        if self.ordering == 'tactical':
+            enemy = self.get_enemy(symbol)
+            wins = [ m for m in moves if self.completes_line(m[0], m[1], symbol) ]
+            blocks = [ m for m in moves if m not in wins and self.completes_line(m[0], m[1], enemy) ]
+            return wins + blocks + [ m for m in moves if m not in wins and m not in blocks ]
+        if self.ordering == 'killer':
+            killers = [ m for m in self.killers.get(len(moves), []) if m in moves ]
+            return killers + [ m for m in moves if m not in killers ]
+        if self.ordering == 'history':
+            moves.sort(key=lambda m: -self.history[m])
+        return moves
+
+    def record_cutoff(self, x, y):
+        """
+        Remember that the move (x, y) caused a cutoff, for 'killer' and 'history'
+        """
+        # The move has been taken back, so it is one of the empty squares
+        empty = self.moves_left()
+        killers = self.killers.setdefault(empty, [])
+        if (x, y) not in killers:
+            killers.insert(0, (x, y))
+            del killers[2:]
+        self.history[(x, y)] = self.history[(x, y)] + empty*empty
+
     def moves_left(self):
         """
         Get number of moves left until board is full
@@ -243,85 +449,133 @@ class Game:
                     n = n - 1
         return n
 
-    def get_computer_move(self, allow_early_cheat=False):
+    def get_computer_move(self, allow_early_cheat=False, stats=None):
         """
         Return (m, x, y, cheating)
+        The board is left unchanged.
+        If stats (a SearchStats) is given, what the engine did is recorded in it.
         """
-        move = self.max_alpha_beta(-2, 2)
-        temp = Game()
-        temp.copy(self)
-        temp.make_computer_move(move[1], move[2])
-        if allow_early_cheat and self.moves_left() <= 3:
-            # First check if we can win without cheating
-            go = temp.game_over()
-            cheat = self.get_cheating_move()
-            if go and go[0] == self.computer_symbol:
-                # We will win
-                return (move[0], move[1], move[2], False)
-            if cheat:
-                print('Cheating')
-                return (cheat[0], cheat[1], cheat[2], True)
-        # Can the human win in next move?
-        (m, hx, hy) = temp.get_human_move()
-        if temp.is_valid(hx, hy):
-            temp.make_human_move(hx, hy)
-            go = temp.game_over()
-            if go and go[0] != '.':
+        if stats is None:
+            return self.computer_move(allow_early_cheat)
+        saved = self.stats
+        self.stats = stats
+        start = time.perf_counter()
+        try:
+            return self.computer_move(allow_early_cheat)
+        finally:
+            stats.time = stats.time + time.perf_counter() - start
+            self.stats = saved
+
+    def computer_move(self, allow_early_cheat):
+        move = self.best_move()
+        (m, x, y) = move
+        cheat = None
+        early_cheat = allow_early_cheat and self.moves_left() <= 3
+        if early_cheat:
+            cheat = self.timed_cheating_move()
+        # Try the move on the board, and take it back before returning
+        self.make_computer_move(x, y)
+        try:
+            if early_cheat:
+                # First check if we can win without cheating
+                go = self.game_over()
+                if go and go[0] == self.computer_symbol:
+                    # We will win
+                    return (m, x, y, False)
+                if cheat:
+                    print('Cheating')
+                    return (cheat[0], cheat[1], cheat[2], True)
+            # Can the human win in next move?
+            go = self.game_over()
+            threats = [] if go else self.threats(self.human_symbol)
+            if threats:
                 # panic!
-                print('Looking bad - after human move:')
-                if go:
-                    print('- game over')
-                temp.show()
-                temp.erase_move(hx, hy) # undo
-                cheat = temp.get_cheating_move()
+                print('Looking bad - human can win at %s:' % threats)
+                self.show()
+                if self.stats is not None:
+                    self.stats.threats = threats
+                cheat = self.timed_cheating_move()
                 if cheat:
                     print('Cheating')
                     return (cheat[0], cheat[1], cheat[2], True)
-        # No, just do our best for now 
-        return (move[0], move[1], move[2], False)
+            # No, just do our best for now
+            return (m, x, y, False)
+        finally:
+            self.erase_move(x, y)
+
+    def best_move(self):
+        """
+        Return (m, x, y) like max_alpha_beta(-2, 2), using the move book if possible
+        """
+        if self.book is not None:
+            move = self.book.lookup(self)
+            if move:
+                if self.stats is not None:
+                    self.stats.book_moves = self.stats.book_moves + 1
+                return move
+        return self.max_alpha_beta(-2, 2)
+
+    def get_human_move(self, stats=None):
+        """
+        Return (m, x, y) for the human
+        If stats (a SearchStats) is given, the search is recorded in it.
+        """
+        if stats is None:
+            return self.min_alpha_beta(-2, 2)
+        saved = self.stats
+        self.stats = stats
+        start = time.perf_counter()
+        try:
+            return self.min_alpha_beta(-2, 2)
+        finally:
+            stats.time = stats.time + time.perf_counter() - start
+            self.stats = saved
+
+    def timed_cheating_move(self):
+        """
+        Return get_cheating_move(), counting the time in self.stats
+        """
+        if self.stats is None:
+            return self.get_cheating_move()
+        start = time.perf_counter()
+        cheat = self.get_cheating_move()
+        self.stats.cheat_time = self.stats.cheat_time + time.perf_counter() - start
+        return cheat
 
-    def get_human_move(self):
-        return self.min_alpha_beta(-2, 2)
-    
     def get_cheating_move(self):
-        # Scan upper border
-        y = -1
-        for x in range(-1, 4):
-            temp = Game()
-            temp.copy(self)
-            if temp.is_valid(x, y, force=True):
-                temp.make_computer_move(x, y, force=True)
-                if temp.game_won():
-                    return (10, x, y)
-        # Scan lower border
-        y = 3
-        for x in range(-1, 4):
-            temp = Game()
-            temp.copy(self)
-            if temp.is_valid(x, y, force=True):
-                temp.make_computer_move(x, y, force=True)
-                if temp.game_won():
-                    return (9, x, y)
-        # Scan left border
-        x = -1
-        for y in range(0, 3):
-            temp = Game()
-            temp.copy(self)
-            if temp.is_valid(x, y, force=True):
-                temp.make_computer_move(x, y, force=True)
-                if temp.game_won():
-                    return (8, x, y)
-        # Scan left border
-        x = 3
-        for y in range(0, 3):
-            temp = Game()
-            temp.copy(self)
-            if temp.is_valid(x, y, force=True):
-                temp.make_computer_move(x, y, force=True)
-                if temp.game_won():
-                    return (7, x, y)
+        """
+        Return (priority, x, y) for the best border square where the
+        computer wins by cheating, or None
+        """
+        moves = self.get_cheating_moves()
+        if moves:
+            return moves[0]
         return None
 
+    def get_cheating_moves(self):
+        """
+        Return list of (priority, x, y) for every border square where the
+        computer wins by cheating, best first
+        """
+        state = self.current_state
+        sym = self.computer_symbol
+        # If somebody has already won, any move "wins"
+        won = self.game_won()
+        moves = []
+        for (prio, x, y, lines) in CHEAT_SQUARES:
+            c = state[y+1][x+1]
+            if c != ' ' and c != '.':
+                continue
+            if won:
+                moves.append((prio, x, y))
+                continue
+            # The square is empty, so the line is ours if the other two cells are
+            for ((x1, y1), (x2, y2), (x3, y3)), c1, c2 in lines:
+                if (state[y1][x1] == sym) + (state[y2][x2] == sym) + (state[y3][x3] == sym) == 2:
+                    moves.append((prio, x, y))
+                    break
+        return moves
+
     def verify_winner(self, go):
         sym = go[0]
         c1 = go[1]
@@ -334,8 +588,9 @@ class Game:
         dy = 0
         if y != c2[1]:
             dy = 1 if y < c2[1] else -1
+        board = self.get_board()
         for i in range(0, 3):
-            if self.current_state[y+1][x+1] != sym:
+            if board[y+1][x+1] != sym:
                 print('Error: Expected %c at %d, %d (%s -> %s)' % (sym, x, y, str(c1), str(c2)))
                 self.show()
                 return False
@@ -453,6 +708,8 @@ class TestGameMethods(unittest.TestCase):
         g.make_computer_move(1, 2, force=True)
         go = g.game_over()
         self.assertEqual(go[0], 'O')
+        self.assertEqual(go[1], (-1, 0))
+        self.assertEqual(go[2], (1, 2))
         self.assertTrue(g.verify_winner(go))
         # Left 2
         g = Game()
@@ -498,6 +755,8 @@ class TestGameMethods(unittest.TestCase):
         g.make_computer_move(2, 1, force=True)
         go = g.game_over()
         self.assertEqual(go[0], 'O')
+        self.assertEqual(go[1], (0, -1))
+        self.assertEqual(go[2], (2, 1))
         self.assertTrue(g.verify_winner(go))
         # Right 2
         g = Game()
@@ -575,6 +834,72 @@ class TestGameMethods(unittest.TestCase):
         self.assertEqual(go[0], 'O')
         self.assertTrue(g.verify_winner(go))
 
+    def test_game_over_at(self):
+        rng = random.Random(1)
+        cells = [ (x, y) for y in range(-1, 4) for x in range(-1, 4) ]
+        for i in range(0, 200):
+            g = Game()
+            rng.shuffle(cells)
+            for n in range(0, len(cells)):
+                (x, y) = cells[n]
+                g.make_move(x, y, 'X' if n % 2 else 'O', force=True)
+                go = g.game_over()
+                self.assertEqual(g.game_over_at(x, y), go)
+                if go:
+                    break
+
+    def test_book(self):
+        b = book.get_default()
+        self.assertFalse(b is None)
+        rng = random.Random(1)
+        n = 0
+        while n < 200:
+            g = Game()
+            g.set_human(rng.choice([ 'X', 'O' ]))
+            for y in range(1, 4):
+                for x in range(1, 4):
+                    g.current_state[y][x] = rng.choice('..XO')
+            move = b.lookup(g)
+            if move:
+                self.assertEqual(move, g.max_alpha_beta(-2, 2))
+                n = n + 1
+        # Not in book if the border is used
+        g.make_computer_move(-1, -1, force=True)
+        self.assertTrue(b.lookup(g) is None)
+
+    def test_stale_book(self):
+        with open(book.BOOK_FILE, 'rb') as f:
+            data = bytearray(f.read())
+        data[4] = data[4] + 1
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'stale.book')
+            with open(filename, 'wb') as f:
+                f.write(data)
+            with self.assertRaises(Exception):
+                book.Book(filename)
+
+    def test_cheating_moves(self):
+        rng = random.Random(1)
+        cells = [ (x, y) for y in range(-1, 4) for x in range(-1, 4) ]
+        for i in range(0, 300):
+            g = Game()
+            g.set_human(rng.choice([ 'X', 'O' ]))
+            rng.shuffle(cells)
+            for n in range(0, rng.randint(0, 12)):
+                (x, y) = cells[n]
+                g.make_move(x, y, 'X' if n % 2 else 'O', force=(x < 0 or x > 2 or y < 0 or y > 2))
+            # Compare with trying every square on a copy of the game
+            expected = []
+            for (prio, x, y, lines) in CHEAT_SQUARES:
+                temp = Game()
+                temp.copy(g)
+                if temp.is_valid(x, y, force=True):
+                    temp.make_computer_move(x, y, force=True)
+                    if temp.game_won():
+                        expected.append((prio, x, y))
+            self.assertEqual(g.get_cheating_moves(), expected)
+            self.assertEqual(g.get_cheating_move(), expected[0] if expected else None)
+
     def test_find_cheat_move_1(self):
         g = Game()
         g.set_human('O')
@@ -650,6 +975,105 @@ class TestGameMethods(unittest.TestCase):
         go = g.game_over()
         self.assertFalse(go is None)
         self.assertEqual(go[0], 'X')
-        
+
+    def test_move_ordering(self):
+        # All orderings must give the same values
+        rng = random.Random(1)
+        nodes = dict([ (ordering, 0) for ordering in ORDERINGS ])
+        for n in range(0, 30):
+            g = Game()
+            g.book = None
+            g.set_human('O')
+            cells = list(ROW_MAJOR)
+            rng.shuffle(cells)
+            for i in range(0, n % 5):
+                g.make_move(cells[i][0], cells[i][1], 'O' if i % 2 == 0 else 'X')
+            if g.game_over():
+                continue
+            values = []
+            for ordering in ORDERINGS:
+                g.set_move_ordering(ordering)
+                stats = SearchStats()
+                (m, x, y, cheating) = g.get_computer_move(stats=stats)
+                self.assertTrue(g.is_valid(x, y) or cheating)
+                values.append((g.max_alpha_beta(-2, 2)[0], g.min_alpha_beta(-2, 2)[0]))
+                nodes[ordering] = nodes[ordering] + stats.nodes
+            self.assertEqual(len(set(values)), 1)
+        for ordering in ORDERINGS[1:]:
+            self.assertTrue(nodes[ordering] < nodes['row'])
+        with self.assertRaises(Exception):
+            g.set_move_ordering('random')
+
+    def test_threats(self):
+        rng = random.Random(1)
+        for n in range(0, 500):
+            g = Game()
+            cells = [ (x, y) for y in range(-1, 4) for x in range(-1, 4) ]
+            rng.shuffle(cells)
+            for i in range(0, rng.randint(0, 12)):
+                g.make_move(cells[i][0], cells[i][1], rng.choice([ 'X', 'O' ]), force=True)
+            for symbol in [ 'X', 'O' ]:
+                expected = []
+                for (x, y) in ROW_MAJOR:
+                    if g.is_valid(x, y):
+                        g.make_move(x, y, symbol)
+                        go = g.game_over_at(x, y)
+                        g.erase_move(x, y)
+                        if go and go[0] == symbol:
+                            expected.append((x, y))
+                self.assertEqual(g.threats(symbol), expected)
+
+    def test_no_panic_after_winning_move(self):
+        g = Game()
+        g.set_human('O')
+
+        #   X O
+        #   X O
+        #
+        g.make_computer_move(1, 0)
+        g.make_computer_move(1, 1)
+        g.make_human_move(2, 0)
+        g.make_human_move(2, 1)
+        (m, px, py, cheating) = g.get_computer_move()
+        self.assertFalse(cheating)
+        self.assertEqual((m, px, py), (1, 1, 2))
+
+    def test_stats(self):
+        g = Game()
+        g.book = None
+        g.set_human('O')
+        g.make_human_move(1, 1)
+        expected = g.get_computer_move()
+        stats = SearchStats()
+        self.assertEqual(g.get_computer_move(stats=stats), expected)
+        self.assertTrue(stats.nodes > 0)
+        self.assertTrue(stats.cutoffs > 0)
+        self.assertEqual(stats.max_depth, 8)
+        self.assertEqual(stats.depth, 0)
+        self.assertEqual(stats.book_moves, 0)
+        self.assertTrue(stats.game_over_time > 0)
+        self.assertTrue(stats.time >= stats.game_over_time)
+        self.assertEqual(stats.threats, [])
+        self.assertIsNone(g.stats)
+        # Human threatens to win at (0, 1) and (1, 1), computer can only cheat
+        g = Game()
+        g.set_human('O')
+        g.make_human_move(0, 2)
+        g.make_computer_move(1, 2)
+        g.make_human_move(0, 0)
+        g.make_computer_move(2, 2)
+        g.make_human_move(2, 0)
+        stats = SearchStats()
+        (m, px, py, cheating) = g.get_computer_move(stats=stats)
+        self.assertTrue(cheating)
+        self.assertEqual(stats.book_moves, 1)
+        self.assertTrue(stats.threats)
+        for threat in stats.threats:
+            self.assertTrue(threat in [ (0, 1), (1, 1) ])
+        self.assertTrue(stats.cheat_time > 0)
+        stats = SearchStats()
+        g.get_human_move(stats=stats)
+        self.assertTrue(stats.nodes > 0)
+
 if __name__ == "__main__":
     unittest.main()
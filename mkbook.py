@@ -0,0 +1,59 @@
+import argparse
+import os
+import time
+import book
+from minimax import Game
+
+# Generate the move book used by Game.get_computer_move() (see book.py).
+# Run again and bump book.VERSION whenever the search changes.
+
+def board_from_index(index):
+    g = Game()
+    board = g.get_board()
+    for y in range(1, 4):
+        for x in range(1, 4):
+            board[y][x] = '.XO'[index % 3]
+            index = index // 3
+    return g
+
+def make_table(human_symbol):
+    """
+    Return bytearray with one entry per position (see book.py)
+    """
+    table = bytearray([ book.NONE ]) * book.POSITIONS
+    solved = 0
+    for index in range(0, book.POSITIONS):
+        g = board_from_index(index)
+        g.book = None
+        g.set_human(human_symbol)
+        board = g.get_board()
+        nh = sum([ row.count(g.human_symbol) for row in board ])
+        nc = sum([ row.count(g.computer_symbol) for row in board ])
+        # Computer to move, whoever started, and game not decided yet
+        if nh != nc and nh != nc + 1:
+            continue
+        if g.game_over():
+            continue
+        (m, x, y) = g.max_alpha_beta(-2, 2)
+        table[index] = book.encode(m, x, y)
+        solved = solved + 1
+    print('Human %c: %d positions' % (human_symbol, solved))
+    return table
+
+def write_book(filename):
+    # Write to a temporary file first, the old book may be mapped by a running game
+    temp = filename + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(book.HEADER.pack(book.MAGIC, book.VERSION, book.POSITIONS))
+        for symbol in book.SYMBOLS:
+            f.write(make_table(symbol))
+    os.replace(temp, filename)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate move book.')
+    parser.add_argument('-o', '--output', default=book.BOOK_FILE,
+                        help='Output file (default: %s)' % book.BOOK_FILE)
+    args = parser.parse_args()
+    start = time.time()
+    write_book(args.output)
+    print('Wrote %s in %.1f s' % (args.output, time.time() - start))
@@ -7,20 +7,28 @@ import numpy
 import os
 import subprocess
 import time
-from shapely.geometry import LineString, Point
 # Local modules
 from buttonbox import ButtonBox
 import detect
 import display
-from minimax import Game
+import imagesink
+import xolog
+from tracker import GridTracker
+from minimax import Game, SearchStats
 from random import randint
 
+# play.py is run as __main__
+log = xolog.get_logger('play')
+
 port = 0
 cam = cv2.VideoCapture(port)
 cam.set(cv2.CAP_PROP_BUFFERSIZE, 1) # don't store old frames
 
 display = display.Display()
 
+# Classify the cells of the grid on all cores
+detect.WORKERS = os.cpu_count()
+
 bb = ButtonBox()
 
 CAM_GRID_SIZE = 60
@@ -33,9 +41,6 @@ def progress(msg):
     display.show(0, msg)
     print(msg)
     
-def to_tuple(ls):
-    return tuple([ls.coords[0], ls.coords[1]])
-
 def to_list(t):
     return (int(t[0]), int(t[1]))
 
@@ -56,6 +61,7 @@ def get_paper_frame(paper):
 # Return paper boundaries in camera coordinates
 def detect_paper_boundaries(do_paper_detection):
     frame = get_frame()
+    # Not through imagesink: a4detect reads the file right away
     cv2.imwrite('png/paper.png', frame)
     if not do_paper_detection:
         with open('paper.json', 'r') as f:
@@ -122,7 +128,7 @@ def enlarge(area, amount):
 def get_grid_pic(paper, active_square):
     get_frame() # flush old frame
     frame = get_paper_frame(paper)
-    cv2.imwrite("png/frame-paper.png", frame)
+    imagesink.imwrite("png/frame-paper.png", frame)
     return frame
 
 def detect_grid_position(frame):
@@ -140,7 +146,7 @@ def detect_grid_position(frame):
         y1 = 0
     y2 = int(yy[1] + h/3)
     #cv2.imwrite('png/out.png', output)
-    cv2.imwrite('png/nolines.png', nolines)
+    imagesink.imwrite('png/nolines.png', nolines)
     return ((x1, x2), (y1, y2))
     
 def index_to_x(index):
@@ -151,6 +157,8 @@ def index_to_y(index):
 
 def fatal_error(msg):
     print('FATAL: %s' % msg)
+    # What led up to it
+    xolog.dump()
     MAX = 14
     display.show(1, 'FATAL: %s' % msg[0:MAX])
     display.show(2, msg[MAX:])
@@ -218,6 +226,7 @@ aspect_ratio = paper_width/paper_height
 assert (aspect_ratio > 0.9) and (aspect_ratio < 1.1), 'wrong paper aspect ratio (%f)' % aspect_ratio
 
 pen = compute_pen_boundaries()
+tracker = GridTracker(detect_grid_position)
 
 while True:
     cheat_allowed = True if randint(0, 1) > 0 else False
@@ -250,6 +259,11 @@ while True:
 
     # start game loop
     first = True
+    tracker.reset()
+    xx = None
+    yy = None
+    # Picture from the last turn, to only look at cells that have changed
+    previous_pic = None
     while not game_over:
 
         # Wait for human move and detect new symbol
@@ -262,13 +276,17 @@ while True:
             # Detect position of the grid
             progress('Taking picture of grid')
             pic = get_grid_pic(paper, active_square)
-            if first:
-                progress('Detecting grid')
-                xx, yy = detect_grid_position(pic)
-                print("detect_grid_position: %s, %s" % (xx, yy))
+            progress('Detecting grid' if first else 'Tracking grid')
+            last_xx, last_yy = xx, yy
+            xx, yy = tracker.update(pic)
+            print("detect_grid_position: %s, %s" % (xx, yy))
+            if (xx, yy) != (last_xx, last_yy):
+                # Grid has moved, the last picture no longer lines up
+                previous_pic = None
             progress('Detecting symbols')
             pic = cv2.cvtColor(pic, cv2.COLOR_BGR2GRAY)
-            new_squares = detect.detect_symbols(pic, xx, yy, cur_squares, human_symbol)
+            new_squares = detect.detect_symbols(pic, xx, yy, cur_squares, human_symbol,
+                                                previous=previous_pic)
             if not new_squares:
                 if not first:
                     fatal_error('no symbols found')
@@ -295,6 +313,7 @@ while True:
                             new_symbol = row[x]
 
         first = False
+        previous_pic = pic
 
         display.show(1, '%c at %d, %d' % (new_symbol, new_symbol_x, new_symbol_y))
         if human_symbol is None:
@@ -328,7 +347,10 @@ while True:
 
         my_symbol = board.get_enemy(human_symbol)
         print('Determining move for %c' % my_symbol)
-        (m, computer_move_x, computer_move_y, cheating) = board.get_computer_move(allow_early_cheat=cheat_allowed)
+        stats = SearchStats()
+        (m, computer_move_x, computer_move_y, cheating) = board.get_computer_move(allow_early_cheat=cheat_allowed,
+                                                                                  stats=stats)
+        log.info('Engine: %s', stats)
         if plotter and cheating:
             # Fake some moves
             lower_limit = 6000
@@ -0,0 +1,205 @@
+import random
+import unittest
+import bitboard
+from bitboard import BitGame, bit
+from minimax import Game
+
+# Immutable, hashable board position.
+#
+# A Position is the 5 x 5 board (playing field and cheat border) plus which
+# symbol the human plays, packed into a single int: the X mask in bits 0-24,
+# the O mask in bits 25-49 (both in the bitboard.py layout) and the human
+# symbol in bits 50-51. Positions can be used as dict keys, compare in O(1),
+# and copying one is just copying a reference.
+
+HUMAN_SYMBOLS = [ None, 'X', 'O' ]
+O_SHIFT = 25
+HUMAN_SHIFT = 50
+
+# Board coordinates (x, y) of every cell, by bit index
+CELLS = [ (i % 5, i // 5) for i in range(0, 25) ]
+
+class Position:
+    __slots__ = ('key',)
+
+    def __init__(self, x_mask=0, o_mask=0, human_symbol=None):
+        if x_mask & o_mask:
+            raise Exception('Cell occupied by both X and O')
+        if (x_mask | o_mask) & ~bitboard.ALL:
+            raise Exception('Mask outside board')
+        key = x_mask | (o_mask << O_SHIFT) | (HUMAN_SYMBOLS.index(human_symbol) << HUMAN_SHIFT)
+        object.__setattr__(self, 'key', key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Position is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Position is immutable')
+
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __reduce__(self):
+        return (Position, (self.x_mask, self.o_mask, self.human_symbol))
+
+    def __repr__(self):
+        rows = [ ''.join(row) for row in self.get_board() ]
+        return 'Position(%s, human %s)' % ('/'.join(rows), self.human_symbol)
+
+    @property
+    def x_mask(self):
+        return self.key & bitboard.ALL
+
+    @property
+    def o_mask(self):
+        return (self.key >> O_SHIFT) & bitboard.ALL
+
+    @property
+    def human_symbol(self):
+        return HUMAN_SYMBOLS[self.key >> HUMAN_SHIFT]
+
+    def get_mask(self, symbol):
+        if symbol == 'X':
+            return self.x_mask
+        if symbol == 'O':
+            return self.o_mask
+        return 0
+
+    def get_board(self):
+        """
+        Return 5 x 5 list as returned by Game.get_board()
+        """
+        x_mask = self.x_mask
+        o_mask = self.o_mask
+        board = []
+        for y in range(0, 5):
+            row = []
+            for x in range(0, 5):
+                b = bit(x, y)
+                if x_mask & b:
+                    row.append('X')
+                elif o_mask & b:
+                    row.append('O')
+                elif bitboard.INNER & b:
+                    row.append('.')
+                else:
+                    row.append(' ')
+            board.append(row)
+        return board
+
+    def make_move(self, x, y, symbol):
+        """
+        Return new Position with symbol at (x, y) in move coordinates
+        (border squares allowed)
+        """
+        if x < -1 or x > 3 or y < -1 or y > 3:
+            raise Exception('Move (%d, %d) outside board' % (x, y))
+        b = bit(x+1, y+1)
+        if (self.x_mask | self.o_mask) & b:
+            raise Exception('Illegal move at (%d, %d)' % (x, y))
+        if symbol == 'X':
+            return Position(self.x_mask | b, self.o_mask, self.human_symbol)
+        return Position(self.x_mask, self.o_mask | b, self.human_symbol)
+
+    @staticmethod
+    def from_game(game):
+        """
+        Return Position of game (a Game or BitGame)
+        """
+        human = getattr(game, 'human_symbol', None)
+        if isinstance(game, BitGame):
+            return Position(game.x_mask, game.o_mask, human)
+        x_mask = 0
+        o_mask = 0
+        i = 0
+        for row in game.get_board():
+            for c in row:
+                if c == 'X':
+                    x_mask = x_mask | (1 << i)
+                elif c == 'O':
+                    o_mask = o_mask | (1 << i)
+                i = i + 1
+        return Position(x_mask, o_mask, human)
+
+    def to_game(self, game_class=Game):
+        """
+        Return new game_class (Game or BitGame) in this position
+        """
+        g = game_class()
+        if self.human_symbol:
+            g.set_human(self.human_symbol)
+        if isinstance(g, BitGame):
+            g.x_mask = self.x_mask
+            g.o_mask = self.o_mask
+            return g
+        board = g.get_board()
+        for (i, (x, y)) in enumerate(CELLS):
+            if self.x_mask & (1 << i):
+                board[y][x] = 'X'
+            elif self.o_mask & (1 << i):
+                board[y][x] = 'O'
+        return g
+
+class TestPosition(unittest.TestCase):
+
+    def test_round_trip(self):
+        rng = random.Random(1)
+        for i in range(0, 200):
+            board = bitboard.random_position(rng, border=True)
+            g = Game()
+            g.set_human(rng.choice([ 'X', 'O' ]))
+            g.current_state = board
+            p = Position.from_game(g)
+            self.assertEqual(p.get_board(), board)
+            self.assertEqual(p.human_symbol, g.human_symbol)
+            for game_class in [ Game, BitGame ]:
+                h = p.to_game(game_class)
+                self.assertEqual(h.get_board(), board)
+                self.assertEqual(h.human_symbol, g.human_symbol)
+                self.assertEqual(Position.from_game(h), p)
+
+    def test_hashable(self):
+        g = Game()
+        g.set_human('O')
+        g.make_human_move(1, 1)
+        p = Position.from_game(g)
+        q = Position().make_move(1, 1, 'O')
+        # Different human symbol
+        self.assertNotEqual(p, q)
+        self.assertEqual(p, Position(q.x_mask, q.o_mask, 'O'))
+        d = { p: 1 }
+        self.assertEqual(d[Position(q.x_mask, q.o_mask, 'O')], 1)
+        self.assertEqual(len(set([ p, q, Position().make_move(1, 1, 'O') ])), 2)
+
+    def test_immutable(self):
+        p = Position()
+        with self.assertRaises(AttributeError):
+            p.key = 1
+        with self.assertRaises(AttributeError):
+            p.x_mask = 1
+        q = p.make_move(-1, -1, 'X')
+        self.assertEqual(p, Position())
+        self.assertEqual(q.get_board()[0][0], 'X')
+        with self.assertRaises(Exception):
+            q.make_move(-1, -1, 'O')
+
+    def test_outside_board(self):
+        p = Position()
+        for (x, y) in [ (4, 0), (-2, 0), (0, 4), (0, -2), (5, 5) ]:
+            with self.assertRaises(Exception):
+                p.make_move(x, y, 'X')
+        self.assertEqual(p.make_move(3, 3, 'X').get_board()[4][4], 'X')
+
+    def test_game_not_changed(self):
+        g = Game()
+        g.set_human('X')
+        g.make_human_move(0, 0)
+        p = Position.from_game(g)
+        g.make_computer_move(1, 1)
+        self.assertEqual(p.to_game().get_board()[2][2], '.')
+
+if __name__ == "__main__":
+    unittest.main()
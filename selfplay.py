@@ -0,0 +1,174 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import random
+import time
+import unittest
+from bench import percentile
+from minimax import Game
+
+# Self-play tournament: the engine plays the computer against a simulated
+# human, following the game flow in play.py, over a pool of processes.
+
+def random_opponent(g, rng):
+    """
+    Return (x, y) of a random free square
+    """
+    free = [ (x, y) for y in range(0, 3) for x in range(0, 3) if g.is_valid(x, y) ]
+    return rng.choice(free)
+
+def winning_squares(g, symbol):
+    """
+    Return list of (x, y) where symbol would complete a line
+    """
+    squares = []
+    for y in range(0, 3):
+        for x in range(0, 3):
+            if g.is_valid(x, y):
+                g.make_move(x, y, symbol)
+                go = g.game_over_at(x, y)
+                g.erase_move(x, y)
+                if go and go[0] == symbol:
+                    squares.append((x, y))
+    return squares
+
+def greedy_opponent(g, rng):
+    """
+    Win if possible, else block the computer, else play randomly
+    """
+    wins = winning_squares(g, g.human_symbol)
+    if wins:
+        return rng.choice(wins)
+    blocks = winning_squares(g, g.computer_symbol)
+    if blocks:
+        return rng.choice(blocks)
+    return random_opponent(g, rng)
+
+def perfect_opponent(g, rng):
+    (m, x, y) = g.get_human_move()
+    return (x, y)
+
+OPPONENTS = {
+    'random': random_opponent,
+    'greedy': greedy_opponent,
+    'perfect': perfect_opponent,
+}
+
+def play_game(opponent, seed, cheat_probability=0.5):
+    """
+    Play one game against opponent (a key in OPPONENTS).
+    Returns (result, cheated, latencies): result is 'win', 'draw' or 'loss'
+    for the computer, latencies are the times taken by get_computer_move().
+    """
+    rng = random.Random(seed)
+    cheat_allowed = rng.random() < cheat_probability
+    choose = OPPONENTS[opponent]
+    g = Game()
+    g.set_human(rng.choice([ 'X', 'O' ]))
+    cheated = False
+    latencies = []
+    # The engine prints when it cheats or panics
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            (x, y) = choose(g, rng)
+            g.make_human_move(x, y)
+            go = g.game_over()
+            if go:
+                if cheat_allowed and go[0] == '.':
+                    cheat = g.get_cheating_move()
+                    if cheat:
+                        g.make_computer_move(cheat[1], cheat[2], force=True)
+                        cheated = True
+                        go = g.game_over()
+                break
+            start = time.perf_counter()
+            (m, x, y, cheating) = g.get_computer_move(allow_early_cheat=cheat_allowed)
+            latencies.append(time.perf_counter() - start)
+            g.make_computer_move(x, y, force=True)
+            cheated = cheated or cheating
+            go = g.game_over()
+            if go:
+                break
+    if go[0] == g.computer_symbol:
+        result = 'win'
+    elif go[0] == g.human_symbol:
+        result = 'loss'
+    else:
+        result = 'draw'
+    return (result, cheated, latencies)
+
+def play_games(args):
+    (opponent, seeds, cheat_probability) = args
+    return [ play_game(opponent, seed, cheat_probability) for seed in seeds ]
+
+def run_tournament(opponent, games, processes=None, cheat_probability=0.5, seed=0, chunk=50):
+    """
+    Play games against opponent, spread over a process pool.
+    Returns dict with the results.
+    """
+    seeds = list(range(seed, seed + games))
+    jobs = [ (opponent, seeds[i:i+chunk], cheat_probability) for i in range(0, games, chunk) ]
+    start = time.time()
+    if processes == 1:
+        results = [ play_games(job) for job in jobs ]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(play_games, jobs)
+    elapsed = time.time() - start
+    counts = { 'win': 0, 'draw': 0, 'loss': 0 }
+    cheats = 0
+    latencies = []
+    for r in results:
+        for (result, cheated, lat) in r:
+            counts[result] = counts[result] + 1
+            cheats = cheats + cheated
+            latencies.extend(lat)
+    return { 'opponent': opponent, 'games': games, 'elapsed': elapsed,
+             'win': counts['win'], 'draw': counts['draw'], 'loss': counts['loss'],
+             'cheats': cheats, 'moves': len(latencies),
+             'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99) }
+
+def report(r):
+    n = r['games']
+    print('%-8s %6d games in %6.1f s: win %5.1f%% draw %5.1f%% loss %5.1f%% cheat %5.1f%%  '
+          'get_computer_move p50 %.3f ms p99 %.3f ms' %
+          (r['opponent'], n, r['elapsed'], 100*r['win']/n, 100*r['draw']/n, 100*r['loss']/n,
+           100*r['cheats']/n, 1000*r['p50'], 1000*r['p99']))
+
+class TestSelfPlay(unittest.TestCase):
+
+    def test_never_loses(self):
+        for opponent in OPPONENTS:
+            r = run_tournament(opponent, 20, processes=1)
+            self.assertEqual(r['win'] + r['draw'] + r['loss'], 20)
+            self.assertEqual(r['loss'], 0)
+
+    def test_no_loss_after_winning_move(self):
+        # Seed 48 used to lose: when the computer's move already won,
+        # get_computer_move() "cheated" on the won board instead
+        for seed in range(0, 200):
+            (result, cheated, latencies) = play_game('random', seed)
+            self.assertNotEqual(result, 'loss')
+
+    def test_deterministic(self):
+        a = play_game('random', 7)
+        b = play_game('random', 7)
+        self.assertEqual(a[:2], b[:2])
+        self.assertEqual(len(a[2]), len(b[2]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Let the engine play against itself.')
+    parser.add_argument('-n', '--games', type=int, default=1000,
+                        help='Number of games per opponent (default 1000)')
+    parser.add_argument('-o', '--opponent', choices=list(OPPONENTS) + [ 'all' ], default='all',
+                        help='Opponent playing the human (default: all)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Number of processes (default: one per CPU)')
+    parser.add_argument('-c', '--cheat', type=float, default=0.5,
+                        help='Probability that cheating is allowed in a game (default 0.5, as in play.py)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='First random seed')
+    args = parser.parse_args()
+    opponents = list(OPPONENTS) if args.opponent == 'all' else [ args.opponent ]
+    for opponent in opponents:
+        report(run_tournament(opponent, args.games, args.processes, args.cheat, args.seed))
@@ -0,0 +1,139 @@
+import math
+import time
+import unittest
+import cv2
+import numpy
+import xolog
+
+# Follow the grid between turns.
+#
+# Running detect.detect_grid() on every turn is slow, running it only on the
+# first turn misses the paper being nudged. GridTracker detects the grid
+# once and then estimates how far it has moved by phase correlation of each
+# new frame against the frame the grid was detected in. Small drift just
+# moves the grid position, large drift (or a poor match) detects the grid
+# again.
+
+# Detect the grid again if it has moved more than this many pixels
+MAX_DRIFT = 15
+# ...or if the phase correlation peak is weaker than this
+MIN_RESPONSE = 0.1
+
+log = xolog.get_logger(__name__)
+
+def to_gray(frame):
+    if len(frame.shape) == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return numpy.float32(frame)
+
+class GridTracker:
+    def __init__(self, detect, max_drift=MAX_DRIFT, min_response=MIN_RESPONSE):
+        """
+        detect(frame) must return the grid position (xx, yy) in frame
+        """
+        self.detect = detect
+        self.max_drift = max_drift
+        self.min_response = min_response
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the grid, for a new game
+        """
+        self.reference = None
+        self.window = None
+        self.reference_xx = None
+        self.reference_yy = None
+        self.drift = (0, 0)
+        self.response = 0
+        self.latency = 0
+        self.detections = 0
+
+    def redetect(self, frame, gray):
+        (self.reference_xx, self.reference_yy) = self.detect(frame)
+        self.reference = gray
+        self.window = cv2.createHanningWindow((gray.shape[1], gray.shape[0]), cv2.CV_32F)
+        self.drift = (0, 0)
+        self.response = 1
+        self.detections = self.detections + 1
+        return (self.reference_xx, self.reference_yy)
+
+    def update(self, frame):
+        """
+        Return grid position (xx, yy) in frame (BGR or grayscale)
+        """
+        start = time.perf_counter()
+        gray = to_gray(frame)
+        if self.reference is None or gray.shape != self.reference.shape:
+            result = self.redetect(frame, gray)
+            self.latency = time.perf_counter() - start
+            log.info('Grid detected at %s, %s in %.1f ms', result[0], result[1], 1000*self.latency)
+            return result
+        ((dx, dy), response) = cv2.phaseCorrelate(self.reference, gray, self.window)
+        drift = math.hypot(dx, dy)
+        if drift > self.max_drift or response < self.min_response:
+            result = self.redetect(frame, gray)
+            self.latency = time.perf_counter() - start
+            log.info('Grid drift %.1f, %.1f (response %.2f) too large, detected again at %s, %s in %.1f ms',
+                     dx, dy, response, result[0], result[1], 1000*self.latency)
+            return result
+        self.drift = (dx, dy)
+        self.response = response
+        (height, width) = gray.shape
+        x = int(round(dx))
+        y = int(round(dy))
+        xx = (max(0, self.reference_xx[0] + x), min(width, self.reference_xx[1] + x))
+        yy = (max(0, self.reference_yy[0] + y), min(height, self.reference_yy[1] + y))
+        self.latency = time.perf_counter() - start
+        log.debug('Grid drift %.1f, %.1f (response %.2f): %s, %s in %.1f ms',
+                  dx, dy, response, xx, yy, 1000*self.latency)
+        return (xx, yy)
+
+def make_test_frame(shift=(0, 0), size=(480, 400)):
+    """
+    Return frame with a grid drawn, moved by shift
+    """
+    (w, h) = size
+    frame = numpy.full((h, w, 3), 220, dtype=numpy.uint8)
+    x0 = 100 + shift[0]
+    y0 = 80 + shift[1]
+    for i in [ 1, 2 ]:
+        cv2.line(frame, (x0 - 40, y0 + i*80), (x0 + 280, y0 + i*80), (30, 30, 30), 3)
+        cv2.line(frame, (x0 + i*80, y0 - 40), (x0 + i*80, y0 + 280), (30, 30, 30), 3)
+    cv2.circle(frame, (x0 + 120, y0 + 120), 25, (30, 30, 30), 2)
+    return frame
+
+class TestGridTracker(unittest.TestCase):
+
+    def detect(self, frame):
+        self.calls = self.calls + 1
+        return ((50, 450), (30, 370))
+
+    def test_tracking(self):
+        self.calls = 0
+        t = GridTracker(self.detect)
+        self.assertEqual(t.update(make_test_frame()), ((50, 450), (30, 370)))
+        self.assertEqual(self.calls, 1)
+        # Small drift moves the grid
+        self.assertEqual(t.update(make_test_frame((4, -3))), ((54, 454), (27, 367)))
+        self.assertAlmostEqual(t.drift[0], 4, delta=0.5)
+        self.assertAlmostEqual(t.drift[1], -3, delta=0.5)
+        self.assertEqual(self.calls, 1)
+        # Large drift detects the grid again
+        t.update(make_test_frame((30, 0)))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(t.detections, 2)
+        # Drift is now relative to the new reference
+        self.assertEqual(t.update(make_test_frame((40, 0))), ((60, 460), (30, 370)))
+        self.assertEqual(self.calls, 2)
+
+    def test_reset(self):
+        self.calls = 0
+        t = GridTracker(self.detect)
+        t.update(make_test_frame())
+        t.reset()
+        t.update(make_test_frame())
+        self.assertEqual(self.calls, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+import collections
+import random
+import time
+import unittest
+from operator import itemgetter
+from minimax import Game
+
+# Transposition table for the alpha-beta search in Game.
+#
+# Positions are stored under a canonical key: the smallest of the board
+# strings under all symmetries of the board, so positions that are rotations
+# or reflections of each other share an entry. Moves are stored in canonical
+# coordinates and mapped back to the orientation of the board being searched.
+
+# Kinds of stored values
+EXACT = 0
+LOWER = 1 # true value is >= stored value
+UPPER = 2 # true value is <= stored value
+
+def symmetries(width, height):
+    """
+    Return list of (forward, inverse) index permutations for the symmetries
+    of a width x height board stored row by row. forward[i] is where cell i
+    ends up, inverse[k] is the cell that ends up at k.
+    A square board has 8 symmetries, other boards have 4.
+    """
+    transforms = [ lambda x, y: (x, y),
+                   lambda x, y: (width-1-x, y),
+                   lambda x, y: (x, height-1-y),
+                   lambda x, y: (width-1-x, height-1-y) ]
+    if width == height:
+        n = width
+        transforms = transforms + [ lambda x, y: (y, x),
+                                    lambda x, y: (n-1-y, x),
+                                    lambda x, y: (y, n-1-x),
+                                    lambda x, y: (n-1-y, n-1-x) ]
+    result = []
+    for t in transforms:
+        forward = [ 0 ] * (width*height)
+        inverse = [ 0 ] * (width*height)
+        for y in range(0, height):
+            for x in range(0, width):
+                (tx, ty) = t(x, y)
+                forward[y*width + x] = ty*width + tx
+                inverse[ty*width + tx] = y*width + x
+        result.append((forward, inverse))
+    return result
+
+class TranspositionTable:
+    def __init__(self, width=5, height=5, border=1, max_entries=100000):
+        """
+        width and height are the size of the board including the border,
+        moves are given relative to the inside of the border
+        """
+        self.width = width
+        self.border = border
+        self.max_entries = max_entries
+        self.symmetries = []
+        for (forward, inverse) in symmetries(width, height):
+            self.symmetries.append((forward, inverse, itemgetter(*inverse)))
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def canonical(self, board):
+        """
+        Return (key, symmetry) for a board given as a list of rows
+        """
+        cells = [ c for row in board for c in row ]
+        best = None
+        best_sym = 0
+        for sym in range(0, len(self.symmetries)):
+            key = ''.join(self.symmetries[sym][2](cells))
+            if best is None or key < best:
+                best = key
+                best_sym = sym
+        return (best, best_sym)
+
+    def probe(self, board, tag, alpha, beta):
+        """
+        Look up board. tag tells apart identical boards that must not share
+        an entry (side to move, symbol played by the computer).
+        Returns (slot, hit), where hit is (value, x, y) if the stored result
+        can be used in the window (alpha, beta), else None.
+        Pass slot to store() when the position has been searched.
+        """
+        (key, sym) = self.canonical(board)
+        key = tag + key
+        entry = self.entries.get(key)
+        if entry:
+            (value, kind, move) = entry
+            if (kind == EXACT or
+                (kind == LOWER and value >= beta) or
+                (kind == UPPER and value <= alpha)):
+                self.hits = self.hits + 1
+                self.entries.move_to_end(key)
+                (x, y) = self.from_canonical(move, sym)
+                return ((key, sym), (value, x, y))
+        self.misses = self.misses + 1
+        return ((key, sym), None)
+
+    def store(self, slot, result, alpha, beta):
+        """
+        Store result (value, x, y) of searching with the window (alpha, beta).
+        Returns result.
+        """
+        (key, sym) = slot
+        (value, x, y) = result
+        if value <= alpha:
+            kind = UPPER
+        elif value >= beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        self.entries[key] = (value, kind, self.to_canonical(x, y, sym))
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            # Evict least recently used
+            self.entries.popitem(last=False)
+        return result
+
+    def to_canonical(self, x, y, sym):
+        if x is None:
+            return None
+        return self.symmetries[sym][0][(y + self.border)*self.width + x + self.border]
+
+    def from_canonical(self, move, sym):
+        if move is None:
+            return (None, None)
+        i = self.symmetries[sym][1][move]
+        return (i % self.width - self.border, i // self.width - self.border)
+
+def transform(board, forward):
+    """
+    Return board (list of rows) with cells moved according to forward
+    """
+    height = len(board)
+    width = len(board[0])
+    cells = [ c for row in board for c in row ]
+    out = [ None ] * len(cells)
+    for i in range(0, len(cells)):
+        out[forward[i]] = cells[i]
+    return [ out[y*width:(y+1)*width] for y in range(0, height) ]
+
+def random_game(rng, human):
+    g = Game()
+    g.set_human(human)
+    cells = [ (x, y) for y in range(0, 3) for x in range(0, 3) ]
+    rng.shuffle(cells)
+    for i in range(0, rng.randint(1, 6)):
+        (x, y) = cells[i]
+        g.make_move(x, y, 'X' if i % 2 == 0 else 'O')
+        if g.game_over():
+            break
+    return g
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_symmetries(self):
+        self.assertEqual(len(symmetries(5, 5)), 8)
+        self.assertEqual(len(symmetries(7, 5)), 4)
+        rng = random.Random(1)
+        tt = TranspositionTable()
+        g = random_game(rng, 'O')
+        (key, sym) = tt.canonical(g.get_board())
+        for (forward, inverse) in symmetries(5, 5):
+            board = transform(g.get_board(), forward)
+            (k, s) = tt.canonical(board)
+            self.assertEqual(k, key)
+            # A move stored from one orientation comes back in the other
+            move = tt.to_canonical(0, 2, sym)
+            (x, y) = tt.from_canonical(move, s)
+            self.assertEqual(forward[(2+1)*5 + 0+1], (y+1)*5 + x+1)
+
+    def test_same_values(self):
+        rng = random.Random(2)
+        tt = TranspositionTable()
+        for i in range(0, 100):
+            g = random_game(rng, 'O' if i % 2 else 'X')
+            if g.game_over():
+                continue
+            (m, x, y) = g.max_alpha_beta(-2, 2)
+            (hm, hx, hy) = g.min_alpha_beta(-2, 2)
+            g.set_transposition_table(tt)
+            (tm, tx, ty) = g.max_alpha_beta(-2, 2)
+            self.assertEqual(tm, m)
+            # The returned move must be legal and as good as the one found without the table
+            g.set_transposition_table(None)
+            g.make_computer_move(tx, ty)
+            self.assertEqual(g.min_alpha_beta(-2, 2)[0], m)
+            g.erase_move(tx, ty)
+            g.set_transposition_table(tt)
+            (tm, tx, ty) = g.min_alpha_beta(-2, 2)
+            self.assertEqual(tm, hm)
+            self.assertTrue(g.is_valid(tx, ty))
+        self.assertTrue(tt.hits > 0)
+        self.assertTrue(tt.misses > 0)
+
+    def test_max_entries(self):
+        tt = TranspositionTable(max_entries=50)
+        g = Game()
+        g.set_human('O')
+        g.set_transposition_table(tt)
+        (m, x, y) = g.max_alpha_beta(-2, 2)
+        self.assertEqual(m, 0)
+        self.assertEqual(len(tt), 50)
+
+    def test_find_best_move(self):
+        g = Game()
+        g.set_human('O')
+        g.set_transposition_table(TranspositionTable())
+        g.make_human_move(1, 1)
+        (m, px, py, cheating) = g.get_computer_move()
+        g.make_computer_move(px, py)
+        g.make_human_move(0, 1)
+        (m, px, py, cheating) = g.get_computer_move()
+        # Computer must play (2, 1) to prevent human win
+        self.assertEqual(px, 2)
+        self.assertEqual(py, 1)
+
+if __name__ == "__main__":
+    for tt in [ None, TranspositionTable() ]:
+        g = Game()
+        g.set_human('O')
+        g.set_transposition_table(tt)
+        start = time.time()
+        g.max_alpha_beta(-2, 2)
+        print('%s: %.3f s' % ('With table' if tt else 'Without table', time.time() - start))
+        if tt:
+            print('%d entries, %d hits, %d misses' % (len(tt), tt.hits, tt.misses))
+    unittest.main()
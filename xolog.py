@@ -0,0 +1,116 @@
+import collections
+import logging
+import unittest
+
+# Logging for the game.
+#
+# Modules get a logger with get_logger(__name__) and log with the usual
+# levels, passing arguments separately so that the message is only
+# formatted if it is output:
+#
+#   log.debug('cell%d%d: %d - %d', x, y, min, max)
+#
+# INFO and above is printed, DEBUG is only kept in a ring buffer of the last
+# RING_SIZE records, which dump() prints when something has gone wrong.
+
+ROOT = 'xo'
+# Number of records kept for dump()
+RING_SIZE = 500
+# Level printed on stdout
+LEVEL = logging.INFO
+
+class ConsoleHandler(logging.Handler):
+    """
+    Print records, so that they go where sys.stdout currently goes
+    """
+    def emit(self, record):
+        try:
+            print(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class RingHandler(logging.Handler):
+    """
+    Keep the last size records, unformatted
+    """
+    def __init__(self, size=RING_SIZE):
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.records = collections.deque(maxlen=size)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dump(self):
+        """
+        Return the kept records as a list of lines, and forget them
+        """
+        lines = []
+        while self.records:
+            lines.append(self.format(self.records.popleft()))
+        return lines
+
+console = ConsoleHandler(LEVEL)
+console.setFormatter(logging.Formatter('%(message)s'))
+ring = RingHandler()
+ring.setFormatter(logging.Formatter('%(relativeCreated)9.1f %(threadName)s %(name)s %(levelname)s: %(message)s'))
+
+root = logging.getLogger(ROOT)
+root.setLevel(logging.DEBUG)
+root.propagate = False
+root.addHandler(console)
+root.addHandler(ring)
+
+def get_logger(name):
+    """
+    Return logger for module name
+    """
+    return logging.getLogger('%s.%s' % (ROOT, name))
+
+def set_level(level):
+    """
+    Set level printed on stdout
+    """
+    console.setLevel(level)
+
+def dump(title='Recent log'):
+    """
+    Print the records in the ring buffer
+    """
+    lines = ring.dump()
+    print('%s (%d records):' % (title, len(lines)))
+    for line in lines:
+        print(line)
+
+class TestLog(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = RingHandler(3)
+        self.log = get_logger('test')
+        self.log.addHandler(self.ring)
+
+    def tearDown(self):
+        self.log.removeHandler(self.ring)
+
+    def test_ring(self):
+        for i in range(0, 5):
+            self.log.debug('record %d', i)
+        lines = self.ring.dump()
+        self.assertEqual(lines, [ 'record 2', 'record 3', 'record 4' ])
+        self.assertEqual(self.ring.dump(), [])
+
+    def test_lazy(self):
+        class Expensive:
+            formatted = 0
+            def __str__(self):
+                Expensive.formatted = Expensive.formatted + 1
+                return 'expensive'
+        record = self.log.makeRecord(self.log.name, logging.DEBUG, __file__, 0, '%s', (Expensive(),), None)
+        # Not printed, kept but not formatted
+        self.assertGreater(console.level, record.levelno)
+        self.ring.handle(record)
+        self.assertEqual(Expensive.formatted, 0)
+        self.assertEqual(self.ring.dump(), [ 'expensive' ])
+        self.assertEqual(Expensive.formatted, 1)
+
+if __name__ == "__main__":
+    unittest.main()